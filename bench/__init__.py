@@ -0,0 +1 @@
+"""Offline benchmark harness for the Pulumi program, driven by pulumi mocks."""
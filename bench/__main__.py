@@ -0,0 +1,145 @@
+"""Benchmark the Pulumi program offline and compare against stored baselines.
+
+    python -m bench                       # every stack, preview and up, vs baselines
+    python -m bench --stack dev --repeat 5
+    python -m bench --config asgSubnetTier=private
+    python -m bench --update-baselines    # record the current numbers
+
+Exits non-zero when a metric regresses past its tolerance.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+from bench.harness import ROOT
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+MODES = ("preview", "up")
+
+# metric -> allowed ratio over the baseline; count metrics must not grow at all
+TOLERANCES = {
+    "wall_seconds": 1.5,
+    "program_rss_mib": 1.25,
+    "sdk_import_seconds": 1.5,
+    "sdk_modules": 1.0,
+    "resources": 1.0,
+    "invokes": 1.0,
+    "max_apply_depth": 1.0,
+    "preview_missing": 1.0,
+}
+
+
+def stacks():
+    names = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "Pulumi.*.yaml"))):
+        names.append(os.path.basename(path)[len("Pulumi."):-len(".yaml")])
+    return names
+
+
+def measure(stack, mode, overrides):
+    cmd = [sys.executable, "-m", "bench.harness", stack]
+    if mode == "preview":
+        cmd.append("--preview")
+    for override in overrides:
+        cmd.extend(["--config", override])
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit("program failed under mocks: stack=%s mode=%s" % (stack, mode))
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def best_of(stack, mode, repeat, overrides):
+    runs = [measure(stack, mode, overrides) for _ in range(repeat)]
+    result = dict(runs[0])
+    result["wall_seconds"] = min(r["wall_seconds"] for r in runs)
+    result["program_rss_mib"] = min(r["program_rss_mib"] for r in runs)
+    result["sdk_import_seconds"] = min(r["sdk_import_seconds"] for r in runs)
+    return result
+
+
+def compare(results, baselines, slack):
+    failures = []
+    for key, metrics in sorted(results.items()):
+        baseline = baselines.get(key)
+        if baseline is None:
+            print("%-14s no baseline recorded" % key)
+            continue
+        for metric, ratio in TOLERANCES.items():
+            if metric not in metrics or metric not in baseline:
+                continue
+            limit = baseline[metric] * (ratio * slack if ratio > 1.0 else 1.0)
+            if metrics[metric] > limit:
+                failures.append("%s %s: %s > %s (baseline %s)"
+                                % (key, metric, metrics[metric], round(limit, 3), baseline[metric]))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", action="append", help="stack to run (default: all)")
+    parser.add_argument("--mode", action="append", choices=MODES, help="default: both")
+    parser.add_argument("--config", action="append", metavar="KEY=VALUE",
+                        help="override a stack config value")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, best kept")
+    parser.add_argument("--slack", type=float, default=1.0,
+                        help="multiplier on the timing/memory tolerances for noisy machines")
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="list resources and invokes")
+    args = parser.parse_args()
+
+    results = {}
+    for stack in args.stack or stacks():
+        runs = {mode: best_of(stack, mode, args.repeat, args.config or [])
+                for mode in args.mode or MODES}
+        if "preview" in runs and "up" in runs:
+            # resources registered inside apply callbacks never show up in a preview
+            missing = set(runs["up"]["resource_names"]) - set(runs["preview"]["resource_names"])
+            runs["preview"]["preview_missing"] = len(missing)
+            runs["preview"]["missing_names"] = sorted(missing)
+        for mode, metrics in runs.items():
+            results["%s/%s" % (stack, mode)] = metrics
+
+    for key, metrics in sorted(results.items()):
+        print("%-14s wall=%.3fs sdk=%.3fs rss=%.1fMiB resources=%d invokes=%d applies=%d apply_depth=%d%s" % (
+            key, metrics["wall_seconds"], metrics["sdk_import_seconds"], metrics["program_rss_mib"], metrics["resources"],
+            metrics["invokes"], metrics["applies"], metrics["max_apply_depth"],
+            " preview_missing=%d" % metrics["preview_missing"] if "preview_missing" in metrics else ""))
+        for name in metrics.get("missing_names", []):
+            print("    not in preview: " + name)
+        if args.verbose:
+            for name in metrics["resource_names"] + metrics["invoke_tokens"]:
+                print("    " + name)
+
+    if args.config:
+        # baselines describe the committed stack config only
+        if args.update_baselines:
+            sys.exit("refusing to record baselines with --config overrides")
+        return
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+
+    if args.update_baselines:
+        for key, metrics in results.items():
+            baselines[key] = {metric: metrics[metric] for metric in TOLERANCES if metric in metrics}
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baselines written to " + os.path.relpath(BASELINES, ROOT))
+        return
+
+    failures = compare(results, baselines, args.slack)
+    for failure in failures:
+        print("REGRESSION " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
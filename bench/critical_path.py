@@ -0,0 +1,193 @@
+"""Deployment critical path of the Pulumi program, computed offline under mocks.
+
+    python -m bench.critical_path [stack] [--export dag.json] [--dot dag.dot]
+                                  [--durations estimates.json] [--config key=value]
+                                  [--strict]
+
+Builds the resource dependency DAG from the mocked `pulumi up`, estimates how
+long a create takes per resource type, and reports the longest path, the
+resources that queue behind slow ones, and explicit `depends_on` edges that
+are redundant or stretch the deployment. `--strict` exits non-zero when any
+explicit edge is redundant or delays its resource.
+"""
+
+import argparse
+import json
+import sys
+
+from bench.harness import execute
+
+# rough create times in seconds per resource type; anything else takes DEFAULT_DURATION
+DURATION_ESTIMATES = {
+    "aws:rds/instance:Instance": 600,
+    "aws:rds/proxy:Proxy": 300,
+    "aws:rds/proxyTarget:ProxyTarget": 120,
+    "aws:lb/loadBalancer:LoadBalancer": 180,
+    "aws:autoscaling/group:Group": 120,
+    "aws:ec2/natGateway:NatGateway": 120,
+    "aws:ec2/vpcEndpoint:VpcEndpoint": 90,
+    "aws:lambda/function:Function": 20,
+    "aws:dynamodb/table:Table": 20,
+    "aws:dax/cluster:Cluster": 600,
+    "aws:elasticache/replicationGroup:ReplicationGroup": 600,
+    "aws:route53/record:Record": 60,
+    "aws:cloudfront/distribution:Distribution": 300,
+    "aws:acm/certificateValidation:CertificateValidation": 180,
+    "aws:ec2/vpc:Vpc": 10,
+    "aws:ec2/subnet:Subnet": 10,
+    "aws:iam/role:Role": 10,
+    "gcp:serviceaccount/key:Key": 10,
+}
+DEFAULT_DURATION = 5
+
+# resources taking at least this long are reported with what queues behind them
+SLOW_THRESHOLD = 300
+
+
+def name_of(key):
+    return key.split("::")[-1]
+
+
+class DependencyGraph:
+    """Resource DAG with per-node duration estimates and an earliest-start schedule."""
+
+    def __init__(self, dependencies, depends_on, durations):
+        # key -> set of keys it waits on
+        self.edges = {key: set(deps) for key, (deps, _) in dependencies.items()}
+        self.implicit = {key: set(implicit) for key, (_, implicit) in dependencies.items()}
+        self.explicit = {key: set(deps) & self.edges.get(key, set())
+                         for key, deps in depends_on.items()}
+        self.durations = {key: durations.get(key.split("::")[0], DEFAULT_DURATION)
+                          for key in self.edges}
+        self.finish = {}
+        for key in self.edges:
+            self._finish_of(key)
+
+    def _finish_of(self, key):
+        if key not in self.finish:
+            self.finish[key] = self.start_of(key) + self.durations[key]
+        return self.finish[key]
+
+    def start_of(self, key, without=None):
+        return max([self._finish_of(dep) for dep in self.edges[key] if dep != without] or [0])
+
+    def ancestors(self, key, skip_edge=None):
+        """Everything `key` transitively waits on, optionally ignoring its direct edge to `skip_edge`."""
+        seen = set()
+        stack = [dep for dep in self.edges[key] if dep != skip_edge]
+        while stack:
+            dep = stack.pop()
+            if dep not in seen:
+                seen.add(dep)
+                stack.extend(self.edges.get(dep, ()))
+        return seen
+
+    def critical_path(self):
+        key = max(self.finish, key=self.finish.get)
+        path = [key]
+        while self.edges[key]:
+            key = max(self.edges[key], key=self.finish.get)
+            path.append(key)
+        return list(reversed(path))
+
+    def explicit_edges(self):
+        """(resource, dependency, redundant, delay) for every explicit depends_on edge."""
+        for key in sorted(self.explicit):
+            for dep in sorted(self.explicit[key]):
+                redundant = dep in self.implicit[key] or dep in self.ancestors(key, skip_edge=dep)
+                delay = 0
+                if dep not in self.implicit[key]:
+                    delay = self.start_of(key) - self.start_of(key, without=dep)
+                yield key, dep, redundant, delay
+
+    def queued_behind(self, threshold):
+        slow = [key for key, duration in self.durations.items() if duration >= threshold]
+        for key in sorted(slow):
+            yield key, sorted(other for other in self.edges if key in self.ancestors(other))
+
+    def to_json(self):
+        critical = set(self.critical_path())
+        return {
+            "nodes": [{
+                "id": key,
+                "estimate": self.durations[key],
+                "start": self.start_of(key),
+                "finish": self.finish[key],
+                "critical": key in critical,
+            } for key in sorted(self.edges)],
+            "edges": [{
+                "from": dep,
+                "to": key,
+                "explicit": dep in self.explicit.get(key, ()),
+                "implicit": dep in self.implicit[key],
+            } for key in sorted(self.edges) for dep in sorted(self.edges[key])],
+        }
+
+    def to_dot(self):
+        critical = set(self.critical_path())
+        lines = ["digraph deployment {", "  rankdir=LR;"]
+        for key in sorted(self.edges):
+            style = ", color=red" if key in critical else ""
+            lines.append('  "%s" [label="%s\\n%ss"%s];' % (key, name_of(key), self.durations[key], style))
+        for key in sorted(self.edges):
+            for dep in sorted(self.edges[key]):
+                style = " [style=dashed]" if dep in self.explicit.get(key, ()) else ""
+                lines.append('  "%s" -> "%s"%s;' % (dep, key, style))
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("stack", nargs="?", default="dev")
+    parser.add_argument("--export", help="write the DAG and schedule as JSON")
+    parser.add_argument("--dot", help="write the DAG as graphviz dot")
+    parser.add_argument("--durations", help="JSON file of {resource type: seconds} overrides")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a stack config value")
+    parser.add_argument("--strict", action="store_true", help="fail on spurious explicit edges")
+    args = parser.parse_args()
+
+    durations = dict(DURATION_ESTIMATES)
+    if args.durations:
+        with open(args.durations) as f:
+            durations.update(json.load(f))
+
+    overrides = dict(override.partition("=")[::2] for override in args.config)
+    result = execute(args.stack, preview=False, overrides=overrides)
+    graph = DependencyGraph(result.monitor.dependencies, result.depends_on, durations)
+
+    path = graph.critical_path()
+    print("critical path (%ss estimated):" % graph.finish[path[-1]])
+    for key in path:
+        print("  %6ss  +%-4s %s" % (graph.finish[key], graph.durations[key], key))
+
+    for key, behind in graph.queued_behind(SLOW_THRESHOLD):
+        print("waiting on %s (%ss): %s" % (name_of(key), graph.durations[key],
+                                           ", ".join(name_of(other) for other in behind) or "nothing"))
+
+    spurious = 0
+    for key, dep, is_redundant, delay in graph.explicit_edges():
+        notes = []
+        if is_redundant:
+            notes.append("redundant")
+        if delay > 0:
+            notes.append("delays start by %ss" % delay)
+        if notes:
+            spurious += 1
+        print("explicit edge %s -> %s%s" % (name_of(key), name_of(dep),
+                                            ": " + ", ".join(notes) if notes else ""))
+
+    if args.export:
+        with open(args.export, "w") as f:
+            json.dump(graph.to_json(), f, indent=2)
+    if args.dot:
+        with open(args.dot, "w") as f:
+            f.write(graph.to_dot())
+
+    if args.strict and spurious:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Run the Pulumi program once under mocks and measure it.
+
+Usage: python -m bench.harness <stack> [--preview] [--config key=value ...]
+
+Prints one JSON object with the metrics of that run. Each run happens in its
+own process (see bench/__main__.py) so module caches and RSS stay isolated;
+`execute` can still be called repeatedly in one process, as the tests do.
+"""
+
+import importlib.machinery
+import json
+import os
+import resource
+import runpy
+import sys
+import time
+import weakref
+
+import yaml
+
+import pulumi
+from pulumi.runtime.stack import run_pulumi_func
+from pulumi.runtime.sync_await import _sync_await
+
+from bench.mocks import ProgramMocks, ProgramMonitor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM = os.path.join(ROOT, "__main__.py")
+# the program's modules are everything under ROOT apart from these
+NOT_PROGRAM = tuple(os.path.join(ROOT, name) + os.sep for name in ("bench", "tests"))
+MOCK_SECRET = "mock-secret"
+
+
+def load_stack_config(stack, overrides=None):
+    """Read Pulumi.yaml and Pulumi.<stack>.yaml into (project, config, secret_keys)."""
+    with open(os.path.join(ROOT, "Pulumi.yaml")) as f:
+        project = yaml.safe_load(f)["name"]
+    with open(os.path.join(ROOT, "Pulumi.%s.yaml" % stack)) as f:
+        raw = yaml.safe_load(f)["config"]
+
+    config = {}
+    secret_keys = []
+    raw = dict(raw, **(overrides or {}))
+    for key, value in raw.items():
+        if ":" not in key:
+            key = project + ":" + key
+        if isinstance(value, dict) and "secure" in value:
+            value = MOCK_SECRET
+            secret_keys.append(key)
+        elif not isinstance(value, str):
+            value = json.dumps(value)
+        config[key] = value
+    return project, config, secret_keys
+
+
+class ApplyTracker:
+    """Counts `Output.apply` calls and the depth of the longest apply chain."""
+
+    def __init__(self):
+        self.depths = weakref.WeakKeyDictionary()
+        self.applies = 0
+        self.max_depth = 0
+
+    def depth_of(self, value):
+        if isinstance(value, pulumi.Output):
+            return self.depths.get(value, 0)
+        return 0
+
+    def install(self):
+        tracker = self
+        original_apply = pulumi.Output.apply
+        original_all = pulumi.Output.all
+
+        def apply(self, func, run_with_unknowns=False):
+            result = original_apply(self, func, run_with_unknowns)
+            depth = tracker.depth_of(self) + 1
+            tracker.depths[result] = depth
+            tracker.applies += 1
+            tracker.max_depth = max(tracker.max_depth, depth)
+            return result
+
+        def all_(*args, **kwargs):
+            result = original_all(*args, **kwargs)
+            values = list(args) + list(kwargs.values())
+            tracker.depths[result] = max([tracker.depth_of(v) for v in values] or [0])
+            return result
+
+        pulumi.Output.apply = apply
+        pulumi.Output.all = staticmethod(all_)
+        self.uninstall = lambda: (setattr(pulumi.Output, "apply", original_apply),
+                                  setattr(pulumi.Output, "all", staticmethod(original_all)))
+
+
+class DependsOnTracker:
+    """Remembers the explicit `depends_on` of every resource, keyed like the reports."""
+
+    def __init__(self):
+        self.depends_on = {}
+
+    def install(self):
+        tracker = self
+        original_init = pulumi.Resource.__init__
+
+        def __init__(self, t, name, custom, props=None, opts=None, *args, **kwargs):
+            depends_on = opts.depends_on if opts is not None else None
+            if isinstance(depends_on, pulumi.Resource):
+                depends_on = [depends_on]
+            if isinstance(depends_on, list):
+                tracker.depends_on[t + "::" + name] = set(
+                    dep._type + "::" + dep._name for dep in depends_on
+                    if isinstance(dep, pulumi.Resource))
+            original_init(self, t, name, custom, props, opts, *args, **kwargs)
+
+        pulumi.Resource.__init__ = __init__
+        self.uninstall = lambda: setattr(pulumi.Resource, "__init__", original_init)
+
+
+class SdkImportTracker:
+    """Time spent loading provider SDK modules; pulumi_aws loads its submodules lazily on first use."""
+
+    PACKAGES = ("pulumi_aws", "pulumi_gcp")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.modules = 0
+        self.depth = 0
+
+    def install(self):
+        tracker = self
+        loaders = (importlib.machinery.SourceFileLoader, importlib.machinery.SourcelessFileLoader)
+        originals = [(loader, loader.exec_module) for loader in loaders]
+        self.uninstall = lambda: [setattr(loader, "exec_module", original) for loader, original in originals]
+        for loader, original_exec in originals:
+
+            def exec_module(self, module, original_exec=original_exec):
+                if not module.__name__.startswith(tracker.PACKAGES):
+                    return original_exec(self, module)
+                tracker.modules += 1
+                tracker.depth += 1
+                start = time.perf_counter()
+                try:
+                    return original_exec(self, module)
+                finally:
+                    tracker.depth -= 1
+                    # nested imports are already inside the outermost one
+                    if not tracker.depth:
+                        tracker.seconds += time.perf_counter() - start
+
+            loader.exec_module = exec_module
+
+
+class ProgramRun:
+    """Everything recorded while the program ran once under mocks."""
+
+    def __init__(self, mocks, monitor, applies, depends_on, sdk_imports, wall, rss_before, rss_after):
+        self.mocks = mocks
+        self.monitor = monitor
+        self.applies = applies
+        self.depends_on = depends_on
+        self.sdk_imports = sdk_imports
+        self.wall = wall
+        self.rss_before = rss_before
+        self.rss_after = rss_after
+
+
+def unload_program():
+    """Drop the program's modules, which run at import time, so the next run builds everything again."""
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if path.startswith(ROOT + os.sep) and not path.startswith(NOT_PROGRAM):
+            del sys.modules[name]
+
+
+def execute(stack, preview, overrides=None):
+    project, config, secret_keys = load_stack_config(stack, overrides)
+    pulumi.runtime.set_all_config(config, secret_keys)
+    mocks = ProgramMocks(preview)
+    monitor = ProgramMonitor(mocks)
+    pulumi.runtime.set_mocks(mocks, project=project, stack=stack, preview=preview,
+                            monitor=monitor)
+    applies = ApplyTracker()
+    applies.install()
+    depends_on = DependsOnTracker()
+    depends_on.install()
+    sdk_imports = SdkImportTracker()
+    sdk_imports.install()
+
+    # the program imports its sibling modules relative to the project root
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    unload_program()
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    try:
+        _sync_await(run_pulumi_func(lambda: runpy.run_path(PROGRAM, run_name="__main__")))
+    finally:
+        os.chdir(cwd)
+        for tracker in (applies, depends_on, sdk_imports):
+            tracker.uninstall()
+    wall = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return ProgramRun(mocks, monitor, applies, depends_on.depends_on, sdk_imports, wall,
+                      rss_before, rss_after)
+
+
+def run(stack, preview, overrides=None):
+    result = execute(stack, preview, overrides)
+    return {
+        "wall_seconds": round(result.wall, 3),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mib": round(result.rss_after / 1024.0, 1),
+        "program_rss_mib": round((result.rss_after - result.rss_before) / 1024.0, 1),
+        "resources": len(result.mocks.resources),
+        "invokes": len(result.mocks.invokes),
+        "applies": result.applies.applies,
+        "max_apply_depth": result.applies.max_depth,
+        "sdk_import_seconds": round(result.sdk_imports.seconds, 3),
+        "sdk_modules": result.sdk_imports.modules,
+        "resource_names": sorted("%s::%s" % r for r in result.mocks.resources),
+        "invoke_tokens": sorted(result.mocks.invokes),
+    }
+
+
+def main(argv):
+    if not argv or argv[0].startswith("-"):
+        sys.exit(__doc__)
+    overrides = {}
+    for index, arg in enumerate(argv):
+        if arg == "--config":
+            key, _, value = argv[index + 1].partition("=")
+            overrides[key] = value
+    print(json.dumps(run(argv[0], "--preview" in argv[1:], overrides)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
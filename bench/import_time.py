@@ -0,0 +1,49 @@
+"""Compare provider SDK import cost with optional program features turned off.
+
+    python -m bench.import_time                  # dev stack, best of 3
+    python -m bench.import_time --stack demo --repeat 5
+
+Each row runs the program under mocks with the given `features` config and
+reports the time spent loading pulumi_aws/pulumi_gcp modules, how many were
+loaded, the whole program wall time and its RSS growth, next to the savings
+against the row with every feature on.
+"""
+
+import argparse
+import json
+
+from bench.__main__ import best_of
+
+FEATURE_SETS = [
+    ("all features", {}),
+    ("no gcpStorage", {"gcpStorage": False}),
+    ("no serverless", {"serverless": False}),
+    ("core only", {"gcpStorage": False, "serverless": False}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", default="dev")
+    parser.add_argument("--mode", choices=("preview", "up"), default="preview")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per row, best kept")
+    args = parser.parse_args()
+
+    reference = None
+    print("%-15s %9s %8s %9s %9s" % ("", "sdk", "modules", "wall", "rss"))
+    for label, features in FEATURE_SETS:
+        overrides = ["features=" + json.dumps(features)] if features else []
+        metrics = best_of(args.stack, args.mode, args.repeat, overrides)
+        row = (metrics["sdk_import_seconds"], metrics["sdk_modules"],
+               metrics["wall_seconds"], metrics["program_rss_mib"])
+        line = "%-15s %8.3fs %8d %8.3fs %6.1fMiB" % ((label,) + row)
+        if reference is None:
+            reference = row
+        else:
+            line += "   saves %.3fs sdk, %d modules, %.3fs wall, %.1fMiB" % (
+                reference[0] - row[0], reference[1] - row[1], reference[2] - row[2], reference[3] - row[3])
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Canned provider responses used to run the program without cloud credentials."""
+
+import pulumi
+from pulumi.runtime.mocks import MockMonitor
+from pulumi.runtime.proto import resource_pb2
+from pulumi.runtime.rpc import UNKNOWN
+
+MOCK_REGION = "us-east-1"
+MOCK_ACCOUNT = "123456789012"
+MOCK_AZS = [MOCK_REGION + suffix for suffix in "abcdef"]
+
+# computed (provider-assigned) outputs per resource type, in wire (camelCase) names
+COMPUTED_OUTPUTS = {
+    "aws:rds/instance:Instance": lambda name: {
+        "endpoint": name + ".mock.us-east-1.rds.amazonaws.com:3306",
+        "address": name + ".mock.us-east-1.rds.amazonaws.com",
+    },
+    "aws:rds/proxy:Proxy": lambda name: {
+        "endpoint": name + ".proxy-mock.us-east-1.rds.amazonaws.com",
+    },
+    "aws:lb/loadBalancer:LoadBalancer": lambda name: {
+        "dnsName": name + "-mock.us-east-1.elb.amazonaws.com",
+        "zoneId": "Z35SXDOTRQ7X7K",
+        "arnSuffix": "app/" + name + "/50dc6c495c0c9188",
+    },
+    "aws:lb/targetGroup:TargetGroup": lambda name: {
+        "arnSuffix": "targetgroup/" + name + "/73e2d6bc24d8a067",
+    },
+    "aws:dax/cluster:Cluster": lambda name: {
+        "clusterAddress": name + ".abc123.dax-clusters.us-east-1.amazonaws.com",
+    },
+    "aws:elasticache/replicationGroup:ReplicationGroup": lambda name: {
+        "primaryEndpointAddress": "master." + name + ".abc123.use1.cache.amazonaws.com",
+        "readerEndpointAddress": "replica." + name + ".abc123.use1.cache.amazonaws.com",
+        "configurationEndpointAddress": "clustercfg." + name + ".abc123.use1.cache.amazonaws.com",
+    },
+    "aws:cloudfront/distribution:Distribution": lambda name: {
+        "domainName": "d111111abcdef8.cloudfront.net",
+        "hostedZoneId": "Z2FDTNDATAQYW2",
+    },
+    "aws:acm/certificate:Certificate": lambda name: {
+        "domainValidationOptions": [{
+            "domainName": "mock.example.com",
+            "resourceRecordName": "_x1.mock.example.com.",
+            "resourceRecordType": "CNAME",
+            "resourceRecordValue": "_x2.acm-validations.aws.",
+        }],
+    },
+    "aws:lambda/function:Function": lambda name: {
+        "version": "1",
+    },
+    "gcp:serviceaccount/account:Account": lambda name: {
+        "email": name + "@mock-project.iam.gserviceaccount.com",
+        "name": "projects/mock-project/serviceAccounts/" + name,
+    },
+    "gcp:serviceaccount/key:Key": lambda name: {
+        "privateKey": "bW9jay1wcml2YXRlLWtleQ==",
+    },
+}
+
+INVOKE_RESULTS = {
+    "aws:index/getAvailabilityZones:getAvailabilityZones": lambda args: {
+        "names": MOCK_AZS,
+        "zoneIds": ["use1-az" + str(index + 1) for index in range(len(MOCK_AZS))],
+        "id": MOCK_REGION,
+    },
+    "aws:ec2/getAmi:getAmi": lambda args: {
+        "imageId": args["filters"][0]["values"][0],
+        "rootDeviceName": "/dev/xvda",
+        "id": args["filters"][0]["values"][0],
+    },
+}
+
+
+class ProgramMocks(pulumi.runtime.Mocks):
+    """Records every resource and invoke; outputs are unknown in preview like the real engine."""
+
+    def __init__(self, preview):
+        self.preview = preview
+        self.resources = []
+        # type::name -> provider reference and inputs, for checks on what went where
+        self.providers = {}
+        self.inputs = {}
+        self.invokes = []
+
+    def new_resource(self, args):
+        self.resources.append((args.typ, args.name))
+        self.providers[args.typ + "::" + args.name] = args.provider
+        self.inputs[args.typ + "::" + args.name] = args.inputs
+        computed = {"arn": "arn:aws:mock:%s:%s:%s" % (MOCK_REGION, MOCK_ACCOUNT, args.name)}
+        if "name" not in args.inputs:
+            computed["name"] = args.name
+        computed.update(COMPUTED_OUTPUTS.get(args.typ, lambda name: {})(args.name))
+        if self.preview:
+            computed = {key: UNKNOWN for key in computed}
+            return "", dict(args.inputs, **computed)
+        return args.name + "-id", dict(args.inputs, **computed)
+
+    def call(self, args):
+        self.invokes.append(args.token)
+        return INVOKE_RESULTS.get(args.token, lambda args: {})(args.args), []
+
+
+
+def resource_key(urn):
+    """`type::name` for a URN, the same key used in the bench reports."""
+    qualified_type, name = urn.split("::")[-2:]
+    return qualified_type.split("$")[-1] + "::" + name
+
+
+class ProgramMonitor(MockMonitor):
+    """Mock monitor that has resource inputs sent as plain ids and records dependencies.
+
+    The stock mock monitor rebuilds resource references on its own event loop,
+    which races with the program's loop when a resource is passed as an input
+    (e.g. `db_subnet_group_name=db_subnet_group`).
+    """
+
+    def __init__(self, mocks):
+        super().__init__(mocks)
+        # type::name -> (every dependency, dependencies that come through inputs)
+        self.dependencies = {}
+
+    def RegisterResource(self, request):
+        if request.type != "pulumi:pulumi:Stack":
+            implicit = set()
+            for deps in request.propertyDependencies.values():
+                implicit.update(resource_key(urn) for urn in deps.urns)
+            key = request.type + "::" + request.name
+            self.dependencies[key] = (
+                set(resource_key(urn) for urn in request.dependencies), implicit)
+        return super().RegisterResource(request)
+
+    def SupportsFeature(self, request):
+        if request.id == "resourceReferences":
+            return type("SupportsFeatureResponse", (object,), {"hasSupport": False})
+        return super().SupportsFeature(request)
+
+    def GetDeploymentInfo(self, request):
+        info = super().GetDeploymentInfo(request)
+        features = [f for f in info.supportedFeatures
+                    if f != resource_pb2.RESOURCE_MONITOR_FEATURE_RESOURCE_REFERENCES]
+        return resource_pb2.DeploymentInfo(supportedFeatures=features)
@@ -0,0 +1,45 @@
+"""Resolve every sizing profile and run the program under mocks with each one.
+
+    python -m bench.profiles                     # dev stack
+    python -m bench.profiles --stack demo
+
+Prints the resolved capacity of each profile in sizing_profiles.yaml and the
+resources the program registers with it. Exits non-zero when a profile does
+not validate or the program fails with it.
+"""
+
+import argparse
+
+from bench.__main__ import measure
+from sizing import load_profiles, resolve_profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", default="dev")
+    args = parser.parse_args()
+
+    print("%-22s %-10s %-15s %-8s %-13s %-24s %6s %-12s %9s" % (
+        "", "instance", "root volume", "asg", "db", "storage", "multiAz", "lambda", "resources"))
+    for name in load_profiles():
+        sizing = resolve_profile(name)
+        db = sizing["db"]
+        storage = "%d GiB %s" % (db["allocatedStorage"], db["storageType"])
+        if db["iops"]:
+            storage += " %d/%d" % (db["iops"], db["storageThroughput"] or 0)
+        if db["maxAllocatedStorage"]:
+            storage += " ->%d" % db["maxAllocatedStorage"]
+        volume = sizing["rootVolume"]
+        root = volume["volumeType"]
+        if volume["iops"]:
+            root += " %d/%d" % (volume["iops"], volume["throughput"] or 0)
+        metrics = measure(args.stack, "preview", ["sizingProfile=" + name])
+        print("%-22s %-10s %-15s %-8s %-13s %-24s %6s %-12s %9d" % (
+            name, sizing["instanceType"], root,
+            "%(minSize)d/%(desiredCapacity)d/%(maxSize)d" % sizing["asg"],
+            db["instanceClass"], storage, db["multiAz"],
+            "%d MB" % sizing["lambda"]["memorySize"], metrics["resources"]))
+
+
+if __name__ == "__main__":
+    main()
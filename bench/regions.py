@@ -0,0 +1,93 @@
+"""Check the per-region resource sets of a multi-region deployment under mocks.
+
+    python -m bench.regions                      # dev stack, two sample regions
+    python -m bench.regions --stack demo
+
+Runs the program (`up` mode) with SAMPLE_REGIONS as the `regions` config and
+checks that every extra region gets the same resources, that they are
+created through that region's provider (apart from the peering requester,
+the primary-side route and rules, and the global Route 53 resources), that
+every region has a latency record with a health check, and that the
+DynamoDB table replicates to each region. Exits non-zero on any mismatch.
+tests/test_regions.py runs the same check under pytest.
+"""
+
+import argparse
+import json
+import sys
+
+from bench.harness import execute
+
+SAMPLE_REGIONS = [
+    {"region": "eu-west-1", "vpcCidrBlock": "10.1.0.0/16", "amiId": "ami-0eu0000000000000",
+     "certificateArn": "arn:aws:acm:eu-west-1:123456789012:certificate/eu"},
+    {"region": "ap-southeast-1", "vpcCidrBlock": "10.2.0.0/16", "amiId": "ami-0ap0000000000000",
+     "certificateArn": "arn:aws:acm:ap-southeast-1:123456789012:certificate/ap"},
+]
+
+# per-region resources, by name suffix, that live in the primary region or are global
+PRIMARY_SIDE = ("-peering", "-webServerRecord", "-webServerRecordHealthCheck")
+
+
+def regional_resources(mocks, region):
+    """type::name -> provider reference of every resource named after `region`."""
+    return {key: provider for key, provider in mocks.providers.items()
+            if key.split("::")[-1].startswith(region + "-")}
+
+
+def check(mocks, regions):
+    failures = []
+    resource_sets = {}
+    for region in regions:
+        resources = regional_resources(mocks, region)
+        resource_sets[region] = sorted("%s::%s" % (key.split("::")[0], key.split("::")[-1][len(region):])
+                                       for key in resources)
+        for key, provider in sorted(resources.items()):
+            name = key.split("::")[-1]
+            primary_side = (name.endswith(PRIMARY_SIDE) or "-mysqlIngressRule" in name
+                            or "-primary-peering-route" in name)
+            in_region = "pulumi:providers:aws::%s::" % region in provider
+            if primary_side == in_region:
+                failures.append("%s: created through %s" % (key, provider or "the default provider"))
+        print("%-16s %3d resources, %3d through its provider" % (
+            region, len(resources), sum(1 for provider in resources.values() if provider)))
+
+    reference = resource_sets[regions[0]]
+    for region in regions[1:]:
+        if resource_sets[region] != reference:
+            failures.append("%s: resource set differs from %s: %s" % (
+                region, regions[0], sorted(set(resource_sets[region]) ^ set(reference))))
+
+    records = {key: inputs for key, inputs in mocks.inputs.items()
+               if key.startswith("aws:route53/record:Record::") and key.endswith("webServerRecord")}
+    routed = {inputs.get("setIdentifier") for inputs in records.values()
+              if inputs.get("healthCheckId") and inputs.get("latencyRoutingPolicies")}
+    missing = set(regions) - routed
+    if missing or len(routed) != len(regions) + 1:
+        failures.append("latency records with health checks for %s, missing %s"
+                        % (sorted(routed), sorted(missing)))
+
+    table = mocks.inputs.get("aws:dynamodb/table:Table::TrackEmail")
+    if table is not None:
+        replicas = sorted(replica["regionName"] for replica in table.get("replicas", []))
+        if replicas != sorted(regions) or not table.get("streamEnabled"):
+            failures.append("TrackEmail replicas %s, stream %s" % (replicas, table.get("streamEnabled")))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stack", default="dev")
+    args = parser.parse_args()
+
+    result = execute(args.stack, False, {"regions": json.dumps(SAMPLE_REGIONS)})
+    failures = check(result.mocks, [settings["region"] for settings in SAMPLE_REGIONS])
+    for failure in failures:
+        print("FAIL " + failure)
+    if failures:
+        sys.exit(1)
+    print("ok: %d resources in total" % len(result.mocks.resources))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""CloudFront in front of the web app load balancer, driven by the `cloudFront` stack config.
+
+The default behavior is not cached and passes every viewer header, cookie and
+query string through, so the app behaves as it does behind the ALB alone.
+Each entry of `cachedPaths` gets its own cache policy and is served from the
+edge for its TTLs. The Host header always reaches the origin, which lets
+CloudFront validate the ALB certificate for the site domain.
+"""
+
+import pulumi
+import pulumi_aws as aws
+
+DEFAULTS = {
+    "enabled": False,
+    # ACM certificate in us-east-1; one is requested and DNS-validated when unset
+    "certificateArn": None,
+    "priceClass": "PriceClass_100",
+    # e.g. "us-east-1"; an extra caching layer in front of the origin
+    "originShieldRegion": None,
+    # e.g. [{"pathPattern": "/static/*", "defaultTtl": 86400}]
+    "cachedPaths": [],
+}
+
+PATH_DEFAULTS = {
+    "minTtl": 0,
+    "defaultTtl": 86400,
+    "maxTtl": 31536000,
+    # query strings that are part of the cache key and forwarded
+    "queryStrings": [],
+}
+
+# AWS managed policies
+CACHING_DISABLED_POLICY = "4135ea2d-6df8-44a3-9df3-4b5a84be39ad"
+ALL_VIEWER_REQUEST_POLICY = "216adef6-5c7f-47e4-b989-5492eafa07d3"
+
+ALB_ORIGIN_ID = "webAppLoadBalancer"
+
+
+def cdn_settings(overrides):
+    """Merge the `cloudFront` config object over DEFAULTS and each cached path over PATH_DEFAULTS."""
+    settings = dict(DEFAULTS, **(overrides or {}))
+    settings["cachedPaths"] = [dict(PATH_DEFAULTS, **path) for path in settings["cachedPaths"]]
+    return settings
+
+
+def _certificate(domain_name, hosted_zone_id, region):
+    """DNS-validated certificate for `domain_name`; CloudFront only takes certificates from us-east-1."""
+    opts = None
+    if region != "us-east-1":
+        opts = pulumi.ResourceOptions(provider=aws.Provider("usEast1", region="us-east-1"))
+
+    certificate = aws.acm.Certificate("cdnCertificate",
+        opts=opts,
+        domain_name=domain_name,
+        validation_method="DNS")
+
+    validation_record = aws.route53.Record("cdnCertificateValidation",
+        zone_id=hosted_zone_id,
+        name=certificate.domain_validation_options[0].resource_record_name,
+        type=certificate.domain_validation_options[0].resource_record_type,
+        records=[certificate.domain_validation_options[0].resource_record_value],
+        ttl=60,
+        allow_overwrite=True)
+
+    validation = aws.acm.CertificateValidation("cdnCertificateValidated",
+        opts=opts,
+        certificate_arn=certificate.arn,
+        validation_record_fqdns=[validation_record.fqdn])
+    return validation.certificate_arn
+
+
+def create_distribution(load_balancer, domain_name, hosted_zone_id, region, settings):
+    """Distribution with the ALB as its only origin; returns it for the Route 53 alias."""
+    certificate_arn = settings["certificateArn"] or _certificate(domain_name, hosted_zone_id, region)
+
+    ordered_behaviors = []
+    if settings["cachedPaths"]:
+        # cached paths forward only the Host header and their cache key query strings
+        origin_request_policy = aws.cloudfront.OriginRequestPolicy("cdnCachedOriginRequest",
+            headers_config={
+                "header_behavior": "whitelist",
+                "headers": {"items": ["Host"]},
+            },
+            cookies_config={"cookie_behavior": "none"},
+            query_strings_config={"query_string_behavior": "none"})
+
+    for index, path in enumerate(settings["cachedPaths"]):
+        cache_policy = aws.cloudfront.CachePolicy("cdnCachePolicy" + str(index),
+            comment=path["pathPattern"],
+            min_ttl=path["minTtl"],
+            default_ttl=path["defaultTtl"],
+            max_ttl=path["maxTtl"],
+            parameters_in_cache_key_and_forwarded_to_origin={
+                # compressed variants are cached separately
+                "enable_accept_encoding_gzip": True,
+                "enable_accept_encoding_brotli": True,
+                "headers_config": {"header_behavior": "none"},
+                "cookies_config": {"cookie_behavior": "none"},
+                "query_strings_config": {
+                    "query_string_behavior": "whitelist" if path["queryStrings"] else "none",
+                    "query_strings": {"items": path["queryStrings"]} if path["queryStrings"] else None,
+                },
+            })
+        ordered_behaviors.append({
+            "path_pattern": path["pathPattern"],
+            "target_origin_id": ALB_ORIGIN_ID,
+            "viewer_protocol_policy": "redirect-to-https",
+            "allowed_methods": ["GET", "HEAD", "OPTIONS"],
+            "cached_methods": ["GET", "HEAD"],
+            "compress": True,
+            "cache_policy_id": cache_policy.id,
+            "origin_request_policy_id": origin_request_policy.id,
+        })
+
+    origin_shield = None
+    if settings["originShieldRegion"]:
+        origin_shield = {"enabled": True, "origin_shield_region": settings["originShieldRegion"]}
+
+    return aws.cloudfront.Distribution("webAppDistribution",
+        enabled=True,
+        comment=domain_name,
+        aliases=[domain_name],
+        price_class=settings["priceClass"],
+        http_version="http2and3",
+        origins=[{
+            "origin_id": ALB_ORIGIN_ID,
+            "domain_name": load_balancer.dns_name,
+            "origin_shield": origin_shield,
+            "custom_origin_config": {
+                "http_port": 80,
+                "https_port": 443,
+                "origin_protocol_policy": "https-only",
+                "origin_ssl_protocols": ["TLSv1.2"],
+                "origin_keepalive_timeout": 60,
+            },
+        }],
+        default_cache_behavior={
+            "target_origin_id": ALB_ORIGIN_ID,
+            "viewer_protocol_policy": "redirect-to-https",
+            "allowed_methods": ["GET", "HEAD", "OPTIONS", "PUT", "POST", "PATCH", "DELETE"],
+            "cached_methods": ["GET", "HEAD"],
+            "compress": True,
+            "cache_policy_id": CACHING_DISABLED_POLICY,
+            "origin_request_policy_id": ALL_VIEWER_REQUEST_POLICY,
+        },
+        ordered_cache_behaviors=ordered_behaviors or None,
+        restrictions={"geo_restriction": {"restriction_type": "none"}},
+        viewer_certificate={
+            "acm_certificate_arn": certificate_arn,
+            "ssl_support_method": "sni-only",
+            "minimum_protocol_version": "TLSv1.2_2021",
+        })
@@ -0,0 +1,420 @@
+"""App instances: user data, instance role, launch templates, auto scaling group, load balancer and DNS."""
+
+import json
+import base64
+import pulumi
+import pulumi_aws as aws
+from cdn import cdn_settings, create_distribution
+from fleet import instance_type_overrides, mixed_instances_policy, spot_settings
+from monitoring import create_agent_config, monitoring_settings
+from regional import latency_record_args
+from scaling import (complete_lifecycle_script, create_scaling_policies, scaling_settings,
+                     warm_pool_args, warm_pool_settings)
+from tracing import WRITE_POLICY, create_sampling_rules, create_trace_group, daemon_script
+from stack_config import (amiId, awsAccountNumber, aws_region, cloudWatchRoleName, config,
+                          databaseName, domainName, hostedZoneId, rdsPassword, rdsUsername,
+                          extra_regions, sizing, sshkeyName, topicName, tracing_config)
+from network import (app_security_group, app_subnetIds, asgSubnetTier, created_publicsubnetsIds,
+                     load_balancer_sg, vpc)
+from database import db_read_replicas, db_writer_endpoint, redis_endpoint, redis_reader_endpoint
+
+autoScalingGroupName = config.require("AutoScalingGroupName")
+scaling_config = scaling_settings(config.get_object("autoScaling"))
+warm_pool_config = warm_pool_settings(config.get_object("warmPool"))
+
+def group_name_in(region):
+    """Name of the web app group in `region`; extra regions append their name, see regions.py."""
+    return autoScalingGroupName if region == aws_region else autoScalingGroupName + "-" + region
+
+### CloudWatch agent config generated here and shipped through SSM, see monitoring.py
+monitoring_config = monitoring_settings(config.get_object("monitoring"))
+agent_config_source = "file:/opt/amazon-cloudwatch-config.json"
+agent_config_parameter = None
+if monitoring_config["generateAgentConfig"]:
+    agent_config_parameter = create_agent_config(monitoring_config, pulumi.get_stack())
+
+### X-Ray daemon on the instances, which report under this service name
+xray_service_name = "webapp-" + pulumi.get_stack()
+tracing_lines = ""
+if tracing_config["enabled"]:
+    tracing_lines = f"""sudo sh -c "echo 'AWS_XRAY_TRACING_NAME={xray_service_name}' >> ${{ENV_FILE}}"
+""" + daemon_script(tracing_config, aws_region)
+
+def create_user_data(endpoint, reader_endpoints, cache_endpoint=None, cache_reader_endpoint=None,
+                     agent_config_name=None, group_region=aws_region):
+    # reads are balanced over the replicas, or go to the writer when there are none
+    reader_url = f"jdbc:mysql://{endpoint}/{databaseName}"
+    if reader_endpoints:
+        reader_url = f"jdbc:mysql:loadbalance://{','.join(reader_endpoints)}/{databaseName}"
+    cache_lines = ""
+    if cache_endpoint:
+        # TLS is on, hence rediss://
+        cache_lines = f"""sudo sh -c "echo 'REDIS_URL=rediss://{cache_endpoint}:6379' >> ${{ENV_FILE}}"
+sudo sh -c "echo 'REDIS_READER_URL=rediss://{cache_reader_endpoint or cache_endpoint}:6379' >> ${{ENV_FILE}}"
+"""
+    return f"""#!/bin/bash
+ENV_FILE="/etc/systemd/system/service.env"
+sudo sh -c "echo 'DATABASE_URL=jdbc:mysql://{endpoint}/{databaseName}?createDatabaseIfNotExist=true' >> ${{ENV_FILE}}"
+sudo sh -c "echo 'DATABASE_READER_URL={reader_url}' >> ${{ENV_FILE}}"
+sudo sh -c "echo 'DATABASE_USER={rdsUsername}' >> ${{ENV_FILE}}"
+sudo sh -c "echo 'DATABASE_PASSWORD={rdsPassword}' >> ${{ENV_FILE}}"
+sudo sh -c "echo 'TOPIC_ARN=arn:aws:sns:{aws_region}:{awsAccountNumber}:{topicName}' >> ${{ENV_FILE}}"
+{cache_lines}{tracing_lines}sudo /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl -a fetch-config -m ec2 -s -c {"ssm:" + agent_config_name if agent_config_name else agent_config_source}
+""" + (complete_lifecycle_script(group_region, group_name_in(group_region))
+       if warm_pool_config["enabled"] else "")
+
+# the parameter name comes from the resource, so instances only launch once it exists
+user_data_content = pulumi.Output.all(agent_config_parameter and agent_config_parameter.name,
+                                     redis_endpoint, redis_reader_endpoint, db_writer_endpoint,
+                                     *[replica.endpoint for replica in db_read_replicas]).apply(
+    lambda values: base64.b64encode(create_user_data(values[3], values[4:], values[1], values[2],
+                                                     values[0]).encode('utf-8')).decode('utf-8'))
+# user_data_content = pulumi.Output.all(my_rds.endpoint, awsAccessKey, awsSecretKey).apply(
+#     lambda args: base64.b64encode(create_user_data(args[0], args[1], args[2]).encode('utf-8')).decode('utf-8')
+# )
+
+### create iam role for cloudwatch
+cloudWatch_role = aws.iam.Role(
+    resource_name= cloudWatchRoleName,
+    force_detach_policies= True,
+    assume_role_policy=json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {
+                "Service": "ec2.amazonaws.com"
+            },
+            "Action": "sts:AssumeRole"
+        }
+    ]
+}),
+)
+
+
+
+#attach policy to cloudwatch role
+attachment = aws.iam.RolePolicyAttachment(
+    "cloudWatchAgentPolicyAttachment",
+    role=cloudWatch_role.name,
+    policy_arn="arn:aws:iam::aws:policy/CloudWatchAgentServerPolicy",
+)
+
+#attachSNSAccess to template
+sns_attachment = aws.iam.RolePolicyAttachment(
+    "SNSAccessPolicyAttachment",
+    role=cloudWatch_role.name,
+    policy_arn="arn:aws:iam::aws:policy/AmazonSNSFullAccess",
+    
+)
+
+
+#let the X-Ray daemon send segments
+if tracing_config["enabled"]:
+    xray_attachment = aws.iam.RolePolicyAttachment(
+        "xrayDaemonPolicyAttachment",
+        role=cloudWatch_role.name,
+        policy_arn=WRITE_POLICY,
+    )
+
+    ### sampling rules for the app and a trace group with Insights over its traces
+    xray_sampling_rules = create_sampling_rules(tracing_config, xray_service_name)
+    xray_trace_group = create_trace_group(tracing_config, xray_service_name)
+
+#let instances complete their own launch lifecycle hook
+if warm_pool_config["enabled"]:
+    lifecycle_policy = aws.iam.RolePolicy("completeLifecycleActionPolicy",
+        role=cloudWatch_role.id,
+        policy=json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Action": "autoscaling:CompleteLifecycleAction",
+                "Resource": [f"arn:aws:autoscaling:{region}:{awsAccountNumber}:autoScalingGroup:*:autoScalingGroupName/{group_name_in(region)}"
+                             for region in [aws_region] + [settings["region"] for settings in extra_regions]],
+            }],
+        }))
+
+# arn:aws:iam::aws:policy/AmazonSNSFullAccess
+#dynamoDB
+cw_profile = aws.iam.InstanceProfile("cwProfile", role= cloudWatch_role.name)
+
+#create app instance
+# app_instance = aws.ec2.Instance(instanceName,
+#     opts=pulumi.ResourceOptions(depends_on=[my_rds]),
+#     ami=amiId,  # AMI ID created by workflow
+#     instance_type='t2.micro', 
+#     iam_instance_profile=cw_profile.name,
+#     # security_groups=[app_security_group.name], 
+#     vpc_security_group_ids = [app_security_group.id],
+#     subnet_id=created_publicsubnets[0].id,
+#     disable_api_termination=False,# No protection against accidental termination
+#     root_block_device=aws.ec2.InstanceRootBlockDeviceArgs(
+#         volume_size=25,
+#         volume_type='gp2',
+#         delete_on_termination=True  # ensure EBS volume is terminated with the instance
+#     ),
+#     key_name=sshkeyName,
+#     user_data= user_data_content,
+#     tags={
+#         'Name': instanceName,
+#     }
+# )
+
+# Create Launch Template
+# instanceTypes switches the group to a mixed instances policy, see fleet.py
+instance_overrides = instance_type_overrides(config.get_object("instanceTypes"))
+if instance_overrides and warm_pool_config["enabled"]:
+    raise ValueError("warmPool can not be combined with instanceTypes (mixed instances policy)")
+# the launch templates are shared by every type of the group
+if sizing["ebsOptimized"] and any(override["type"].startswith("t2.") for override in instance_overrides):
+    raise ValueError("instanceTypes has t2 types, which can not be EBS-optimized; set sizing.ebsOptimized to false")
+
+# root volume from the sizing profile instead of the AMI's default mapping
+root_volume = sizing["rootVolume"]
+if warm_pool_config["poolState"] == "Hibernated" and not root_volume["encrypted"]:
+    raise ValueError("warmPool.poolState Hibernated needs sizing.rootVolume.encrypted")
+
+def launch_template_args(image_id, security_group, user_data, key_name, public_ip, invoke_opts=None):
+    """LaunchTemplate arguments of every app template, in the primary region and the extra ones.
+
+    `invoke_opts` carries the provider of the region `image_id` lives in.
+    """
+    # the AMI's own root device (/dev/xvda, /dev/sda1, ...), so the mapping
+    # resizes the root volume instead of adding a second, empty one
+    root_device_name = aws.ec2.get_ami_output(
+        filters=[{'name': 'image-id', 'values': [image_id]}],
+        opts=invoke_opts).root_device_name
+    return dict(
+        image_id= image_id,
+        key_name= key_name,
+        network_interfaces=[{
+            'associate_public_ip_address': public_ip,
+            'security_groups': [security_group.id],
+        }],
+        user_data= user_data,
+        # 1-minute instance metrics so scaling reacts within a minute
+        monitoring={'enabled': True},
+        # IAM is global, so the instance profile works in every region
+        iam_instance_profile={'name': cw_profile.name},
+        ebs_optimized="true" if sizing["ebsOptimized"] else None,
+        block_device_mappings=[{
+            'device_name': root_device_name,
+            'ebs': {
+                'volume_type': root_volume["volumeType"],
+                'volume_size': root_volume["size"],
+                'iops': root_volume["iops"],
+                'throughput': root_volume["throughput"],
+                'encrypted': "true" if root_volume["encrypted"] else None,
+                'delete_on_termination': "true",
+            },
+        }],
+        hibernation_options={'configured': True} if warm_pool_config["poolState"] == "Hibernated" else None,
+        tags={
+            'Name': 'CSYE6625 template'
+        }
+    )
+
+# no explicit depends_on: user_data_content already waits for the database endpoints
+launch_template = aws.ec2.LaunchTemplate('WebAppLaunchTemplate',
+    name=config.require("LaunchTempName"),
+    instance_type=sizing["instanceType"],
+    **launch_template_args(amiId, app_security_group, user_data_content, sshkeyName,
+                           asgSubnetTier == "public")
+)
+launch_templates = {"x86_64": launch_template}
+
+# Graviton types need an arm64 build of the AMI
+if any(override["architecture"] == "arm64" for override in instance_overrides):
+    launch_templates["arm64"] = aws.ec2.LaunchTemplate('WebAppLaunchTemplateArm64',
+        name=config.require("LaunchTempName") + "_arm64",
+        **launch_template_args(config.require("amiIdArm64"), app_security_group, user_data_content,
+                               sshkeyName, asgSubnetTier == "public")
+    )
+
+### load balancer and target group tuning, overridable with the loadBalancer config object
+lb_config = dict({
+    # round_robin, least_outstanding_requests or weighted_random
+    "algorithm": "least_outstanding_requests",
+    # seconds new targets ramp up; only works with round_robin
+    "slowStart": 0,
+    "deregistrationDelay": 30,
+    "healthCheckPath": "/",
+    "healthCheckInterval": 10,
+    "healthCheckTimeout": 5,
+    "healthyThreshold": 2,
+    "unhealthyThreshold": 3,
+    "http2": True,
+    "idleTimeout": 60,
+    "sslPolicy": "ELBSecurityPolicy-TLS13-1-2-2021-06",
+    "httpRedirect": True,
+}, **(config.get_object("loadBalancer") or {}))
+if lb_config["slowStart"] and lb_config["algorithm"] != "round_robin":
+    raise ValueError("loadBalancer.slowStart needs loadBalancer.algorithm round_robin")
+
+def target_group_args(vpc_id):
+    """TargetGroup arguments of the app in every region."""
+    return dict(
+        port=8080,
+        protocol='HTTP',
+        target_type='instance',
+        vpc_id=vpc_id,
+        # "true", "false" or "use_load_balancer_configuration"
+        load_balancing_cross_zone_enabled=config.get("crossZoneLoadBalancing"),
+        load_balancing_algorithm_type=lb_config["algorithm"],
+        slow_start=lb_config["slowStart"],
+        # in-flight requests get this long to finish on scale-in and deploys
+        deregistration_delay=lb_config["deregistrationDelay"],
+        health_check={
+            'enabled': True,
+            'path': lb_config["healthCheckPath"],
+            'protocol': 'HTTP',
+            'interval': lb_config["healthCheckInterval"],
+            'timeout': lb_config["healthCheckTimeout"],
+            'healthy_threshold': lb_config["healthyThreshold"],
+            'unhealthy_threshold': lb_config["unhealthyThreshold"],
+        })
+
+# Create a Target Group
+target_group = aws.lb.TargetGroup('appTargetGroup', **target_group_args(vpc.id))
+
+
+def auto_scaling_group_args(subnet_ids, target_group, launch_templates):
+    """autoscaling.Group arguments of the app in every region, apart from its name and tags.
+
+    `launch_templates` maps an architecture to its launch template, as for
+    fleet.mixed_instances_policy.
+    """
+    warm_pool, lifecycle_hooks = warm_pool_args(warm_pool_config)
+    return dict(
+        min_size=sizing["asg"]["minSize"],
+        max_size=sizing["asg"]["maxSize"],
+        desired_capacity=sizing["asg"]["desiredCapacity"],
+        default_cooldown=60,
+        # group metrics for the dashboard and the capacity alarm
+        metrics_granularity='1Minute',
+        enabled_metrics=['GroupDesiredCapacity', 'GroupInServiceInstances', 'GroupPendingInstances',
+                         'GroupTerminatingInstances', 'GroupTotalInstances'],
+        # new instances count toward metrics only after warming up, and are not
+        # replaced for failing health checks while they boot
+        default_instance_warmup=scaling_config["instanceWarmup"],
+        health_check_grace_period=config.get_int("healthCheckGracePeriod") or 300,
+        warm_pool=warm_pool,
+        initial_lifecycle_hooks=lifecycle_hooks,
+        # spread over one subnet per AZ so capacity is balanced across zones
+        vpc_zone_identifiers=subnet_ids,
+        target_group_arns =[target_group.arn],
+        launch_template=None if instance_overrides else {
+            'id': launch_templates["x86_64"].id,
+            'version': '$Latest'
+        },
+        mixed_instances_policy=mixed_instances_policy(
+            launch_templates, instance_overrides, spot_settings(config.get_object("spot")))
+            if instance_overrides else None)
+
+# Auto Scaling Group
+auto_scaling_group = aws.autoscaling.Group('WebAppAutoScalingGroup',
+    name=autoScalingGroupName,
+    tags=[{
+        'key': 'Name',
+        'value': 'web-app-instance',
+        'propagate_at_launch': True
+    }],
+    **auto_scaling_group_args(app_subnetIds, target_group, launch_templates)
+)
+
+
+### Application Load Balancer
+load_balancer = aws.lb.LoadBalancer('WebAppLoadBalancer',
+    load_balancer_type='application',
+    security_groups=[load_balancer_sg.id],
+    enable_http2=lb_config["http2"],
+    idle_timeout=lb_config["idleTimeout"],
+    subnets=created_publicsubnetsIds)
+
+app_ingress = aws.ec2.SecurityGroupRule("appIngressRule1",
+                                        type="ingress",
+                                        protocol='tcp',
+                                        from_port=22,
+                                        to_port=22,
+                                        cidr_blocks=['0.0.0.0/0'],
+                                        security_group_id=app_security_group.id)
+                                        # source_security_group_id=load_balancer_sg.id,)
+                                        
+app_ingress2 = aws.ec2.SecurityGroupRule("appIngressRule2",
+                                        type="ingress",
+                                        protocol='tcp',
+                                        from_port=8080,
+                                        to_port=8080,
+                                        security_group_id=app_security_group.id,
+                                        source_security_group_id=load_balancer_sg.id,)
+
+
+### Create a Listener
+# listener = aws.lb.Listener('httpListener',
+#     load_balancer_arn=load_balancer.arn,
+#     port=80,
+#     default_actions=[aws.lb.ListenerDefaultActionArgs(
+#         type="forward",
+#         target_group_arn=target_group.arn,
+#     ),])
+
+listener = aws.lb.Listener("listener",
+    load_balancer_arn=load_balancer.arn,
+    port=443,
+    protocol="HTTPS",
+    ssl_policy=lb_config["sslPolicy"],
+    certificate_arn=config.require("SSLCertificateArn"),
+    default_actions=[{
+        "type": "forward",
+        "target_group_arn": target_group.arn
+    }])
+
+### Redirect plain HTTP to HTTPS
+if lb_config["httpRedirect"]:
+    http_listener = aws.lb.Listener("httpRedirectListener",
+        load_balancer_arn=load_balancer.arn,
+        port=80,
+        protocol="HTTP",
+        default_actions=[{
+            "type": "redirect",
+            "redirect": {
+                "port": "443",
+                "protocol": "HTTPS",
+                "status_code": "HTTP_301",
+            },
+        }])
+
+### Auto Scaling Policies
+scaling_policies = create_scaling_policies(auto_scaling_group, load_balancer, target_group, listener,
+                                           scaling_config)
+
+
+### optionally serve the site through CloudFront, with the ALB as origin
+cdn_config = cdn_settings(config.get_object("cloudFront"))
+record_alias = aws.route53.RecordAliasArgs(
+    name=load_balancer.dns_name,
+    zone_id=load_balancer.zone_id,
+    evaluate_target_health=True,
+)
+if cdn_config["enabled"] and extra_regions:
+    raise ValueError("cloudFront has the primary ALB as its only origin and can not be combined with regions")
+if cdn_config["enabled"]:
+    distribution = create_distribution(load_balancer, domainName, hostedZoneId, aws_region, cdn_config)
+    # CloudFront aliases can't evaluate target health
+    record_alias = aws.route53.RecordAliasArgs(
+        name=distribution.domain_name,
+        zone_id=distribution.hosted_zone_id,
+        evaluate_target_health=False,
+    )
+
+route53_record = aws.route53.Record(
+    # opts=pulumi.ResourceOptions(depends_on=[app_instance]),
+    resource_name= "webServerRecord",
+    zone_id= hostedZoneId,
+    name= domainName,
+    type= "A",
+    aliases=[record_alias],
+    # with extra regions every region has a latency record, see regions.py
+    **(latency_record_args("webServerRecord", aws_region, load_balancer, lb_config["healthCheckPath"])
+       if extra_regions else {}))
@@ -0,0 +1,256 @@
+"""RDS MariaDB with its tuned parameter group, read replicas, RDS Proxy and the Redis cache."""
+
+import json
+import pulumi
+import pulumi_aws as aws
+from db_tuning import mariadb_parameters, max_connections
+from stack_config import (config, databaseName, extra_regions, rdsPassword, rdsUsername, rsdIdentifier,
+                          sizing)
+from network import (app_security_group, available_az, created_privatesubnetsIds, db_subnet_group,
+                     ind_range, vpc)
+
+### security group for rds
+database_security_group = aws.ec2.SecurityGroup("databaseSecurityGroup",
+    description="My RDS security group",
+    vpc_id=vpc.id,
+    egress=[
+        # Allow all outbound traffic.
+        {
+            "protocol": "-1",
+            "from_port": 0,
+            "to_port": 0,
+            "cidr_blocks": ["0.0.0.0/0"],
+        }
+    ],
+    tags={"Name": "DatabaseSecurityGroup"})
+
+
+# Add an ingress rule for MariaDB
+mysql_ingress = aws.ec2.SecurityGroupRule("mysqlIngressRule",
+    type="ingress",
+    from_port=3306,
+    to_port=3306,
+    protocol="tcp",
+    security_group_id=database_security_group.id,
+    source_security_group_id=app_security_group.id) 
+
+### tune the parameter group for the instance class, see db_tuning.py
+dbInstanceClass = sizing["db"]["instanceClass"]
+dbTuningProfile = config.get("dbTuningProfile") or "durability"
+db_parameters = mariadb_parameters(dbInstanceClass, dbTuningProfile, config.get_object("dbParameters"))
+# for the connections alarm
+db_max_connections = max_connections(dbInstanceClass, dbTuningProfile, config.get_object("dbParameters"))
+db_parameter_group = aws.rds.ParameterGroup('csye6225-db-param-group',
+                                            family='mariadb10.6',
+                                            description='Custom Parameter Group for CSYE6225',
+                                            parameters=db_parameters,)
+
+
+my_rds = aws.rds.Instance("SQLInstance",
+        engine="MariaDB",
+        instance_class=dbInstanceClass,
+        allocated_storage=sizing["db"]["allocatedStorage"],
+        storage_type=sizing["db"]["storageType"],
+        iops=sizing["db"]["iops"],
+        storage_throughput=sizing["db"]["storageThroughput"],
+        max_allocated_storage=sizing["db"]["maxAllocatedStorage"],
+        db_name=databaseName,
+        multi_az=sizing["db"]["multiAz"],
+        performance_insights_enabled=sizing["db"]["performanceInsights"],
+        # 7 days is the free tier
+        performance_insights_retention_period=7 if sizing["db"]["performanceInsights"] else None,
+        identifier=rsdIdentifier,
+        username=rdsUsername,
+        password=rdsPassword,
+        # publicly_accessible=True,
+        db_subnet_group_name=db_subnet_group,
+        parameter_group_name=db_parameter_group.name,
+        skip_final_snapshot=True,
+        # read replicas, including the ones in extra regions, replicate from automated backups
+        backup_retention_period=1 if config.get_int("dbReadReplicas") or extra_regions else None,
+        vpc_security_group_ids=[database_security_group.id])
+
+### read replicas, spread over the AZs of the DB subnet group
+db_read_replicas = []
+for replica_index in range(config.get_int("dbReadReplicas") or 0):
+    db_read_replicas.append(aws.rds.Instance("SQLReadReplica" + str(replica_index),
+        replicate_source_db=my_rds.identifier,
+        instance_class=dbInstanceClass,
+        identifier=rsdIdentifier + "-replica" + str(replica_index),
+        availability_zone=available_az[(replica_index + 1) % ind_range],
+        max_allocated_storage=sizing["db"]["maxAllocatedStorage"],
+        performance_insights_enabled=sizing["db"]["performanceInsights"],
+        parameter_group_name=db_parameter_group.name,
+        skip_final_snapshot=True,
+        vpc_security_group_ids=[database_security_group.id]))
+
+### RDS Proxy in front of the writer pools connections from the app instances
+db_proxy_config = dict({
+    "enabled": False,
+    "maxConnectionsPercent": 90,
+    "maxIdleConnectionsPercent": 50,
+    "borrowTimeout": 120,
+    "idleClientTimeout": 1800,
+}, **(config.get_object("dbProxy") or {}))
+
+db_writer_endpoint = my_rds.endpoint
+if db_proxy_config["enabled"]:
+    db_proxy_secret = aws.secretsmanager.Secret("dbProxySecret",
+        name_prefix=rsdIdentifier + "-proxy-")
+
+    db_proxy_secret_version = aws.secretsmanager.SecretVersion("dbProxySecretVersion",
+        secret_id=db_proxy_secret.id,
+        secret_string=pulumi.Output.secret(json.dumps({
+            "username": rdsUsername,
+            "password": rdsPassword,
+        })))
+
+    db_proxy_role = aws.iam.Role("dbProxyRole",
+        assume_role_policy=json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {
+                    "Service": "rds.amazonaws.com"
+                },
+                "Action": "sts:AssumeRole"
+            }
+        ]
+    }))
+
+    db_proxy_role_policy = aws.iam.RolePolicy("dbProxySecretPolicy",
+        role=db_proxy_role.id,
+        policy=db_proxy_secret.arn.apply(lambda arn: json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Action": "secretsmanager:GetSecretValue",
+                "Resource": arn,
+            }],
+        })))
+
+    db_proxy_security_group = aws.ec2.SecurityGroup("dbProxySecurityGroup",
+        description="RDS Proxy security group",
+        vpc_id=vpc.id,
+        egress=[
+            # Allow all outbound traffic.
+            {
+                "protocol": "-1",
+                "from_port": 0,
+                "to_port": 0,
+                "cidr_blocks": ["0.0.0.0/0"],
+            }
+        ],
+        tags={"Name": "DatabaseProxySecurityGroup"})
+
+    proxy_app_ingress = aws.ec2.SecurityGroupRule("dbProxyIngressRule",
+        type="ingress",
+        from_port=3306,
+        to_port=3306,
+        protocol="tcp",
+        security_group_id=db_proxy_security_group.id,
+        source_security_group_id=app_security_group.id)
+
+    proxy_db_ingress = aws.ec2.SecurityGroupRule("mysqlProxyIngressRule",
+        type="ingress",
+        from_port=3306,
+        to_port=3306,
+        protocol="tcp",
+        security_group_id=database_security_group.id,
+        source_security_group_id=db_proxy_security_group.id)
+
+    db_proxy = aws.rds.Proxy("dbProxy",
+        name=rsdIdentifier + "-proxy",
+        engine_family="MYSQL",
+        role_arn=db_proxy_role.arn,
+        idle_client_timeout=db_proxy_config["idleClientTimeout"],
+        vpc_subnet_ids=created_privatesubnetsIds,
+        vpc_security_group_ids=[db_proxy_security_group.id],
+        auths=[{
+            "auth_scheme": "SECRETS",
+            "iam_auth": "DISABLED",
+            "secret_arn": db_proxy_secret.arn,
+        }])
+
+    db_proxy_target_group = aws.rds.ProxyDefaultTargetGroup("dbProxyTargetGroup",
+        db_proxy_name=db_proxy.name,
+        connection_pool_config={
+            "max_connections_percent": db_proxy_config["maxConnectionsPercent"],
+            "max_idle_connections_percent": db_proxy_config["maxIdleConnectionsPercent"],
+            "connection_borrow_timeout": db_proxy_config["borrowTimeout"],
+        })
+
+    db_proxy_target = aws.rds.ProxyTarget("dbProxyTarget",
+        db_proxy_name=db_proxy.name,
+        target_group_name=db_proxy_target_group.name,
+        db_instance_identifier=my_rds.identifier)
+
+    db_writer_endpoint = pulumi.Output.concat(db_proxy.endpoint, ":3306")
+
+### optional ElastiCache Redis in the private subnets for hot reads
+cache_config = dict({
+    "enabled": False,
+    "nodeType": "cache.t4g.micro",
+    # more than one shard turns on cluster mode
+    "shards": 1,
+    "replicasPerShard": 1,
+    "engineVersion": "7.1",
+}, **(config.get_object("redisCache") or {}))
+
+redis_endpoint = None
+redis_reader_endpoint = None
+if cache_config["enabled"]:
+    cache_cluster_mode = cache_config["shards"] > 1
+
+    cache_security_group = aws.ec2.SecurityGroup("cacheSecurityGroup",
+        description="ElastiCache Redis security group",
+        vpc_id=vpc.id,
+        egress=[
+            # Allow all outbound traffic.
+            {
+                "protocol": "-1",
+                "from_port": 0,
+                "to_port": 0,
+                "cidr_blocks": ["0.0.0.0/0"],
+            }
+        ],
+        tags={"Name": "CacheSecurityGroup"})
+
+    redis_ingress = aws.ec2.SecurityGroupRule("redisIngressRule",
+        type="ingress",
+        from_port=6379,
+        to_port=6379,
+        protocol="tcp",
+        security_group_id=cache_security_group.id,
+        source_security_group_id=app_security_group.id)
+
+    cache_subnet_group = aws.elasticache.SubnetGroup("cacheSubnetGroup",
+        subnet_ids=created_privatesubnetsIds,
+        description="private subnet group for redis")
+
+    redis_cache = aws.elasticache.ReplicationGroup("redisCache",
+        description="web app cache",
+        engine="redis",
+        engine_version=cache_config["engineVersion"],
+        node_type=cache_config["nodeType"],
+        cluster_mode="enabled" if cache_cluster_mode else "disabled",
+        parameter_group_name="default.redis7.cluster.on" if cache_cluster_mode else "default.redis7",
+        num_node_groups=cache_config["shards"],
+        replicas_per_node_group=cache_config["replicasPerShard"],
+        # cluster mode requires automatic failover even without replicas;
+        # otherwise both need a replica to fail over to
+        automatic_failover_enabled=cache_cluster_mode or cache_config["replicasPerShard"] > 0,
+        multi_az_enabled=cache_config["replicasPerShard"] > 0,
+        subnet_group_name=cache_subnet_group.name,
+        security_group_ids=[cache_security_group.id],
+        at_rest_encryption_enabled=True,
+        transit_encryption_enabled=True,
+        apply_immediately=True)
+
+    if cache_cluster_mode:
+        redis_endpoint = redis_cache.configuration_endpoint_address
+    else:
+        redis_endpoint = redis_cache.primary_endpoint_address
+        if cache_config["replicasPerShard"]:
+            redis_reader_endpoint = redis_cache.reader_endpoint_address
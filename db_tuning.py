@@ -0,0 +1,146 @@
+"""MariaDB parameter group values sized from the RDS instance class.
+
+`mariadb_parameters` looks the class up in INSTANCE_CLASSES (memory, vCPUs)
+and derives buffer pool, connection, redo log, flush and query cache
+settings for a profile, out of the memory left after an OS and RDS reserve:
+
+* durability: flush and sync the binlog on every commit (the RDS behaviour)
+* throughput: flush the redo log once a second and leave binlog syncing to
+  the OS, trading up to a second of commits on a crash for write throughput
+"""
+
+MIB = 1024 * 1024
+GIB = 1024 * MIB
+
+# instance class -> (memory in GiB, vCPUs)
+INSTANCE_CLASSES = {
+    "db.t3.micro": (1, 2),
+    "db.t3.small": (2, 2),
+    "db.t3.medium": (4, 2),
+    "db.t3.large": (8, 2),
+    "db.t3.xlarge": (16, 4),
+    "db.t3.2xlarge": (32, 8),
+    "db.t4g.micro": (1, 2),
+    "db.t4g.small": (2, 2),
+    "db.t4g.medium": (4, 2),
+    "db.t4g.large": (8, 2),
+    "db.t4g.xlarge": (16, 4),
+    "db.t4g.2xlarge": (32, 8),
+    "db.m5.large": (8, 2),
+    "db.m5.xlarge": (16, 4),
+    "db.m5.2xlarge": (32, 8),
+    "db.m5.4xlarge": (64, 16),
+    "db.m6g.large": (8, 2),
+    "db.m6g.xlarge": (16, 4),
+    "db.m6g.2xlarge": (32, 8),
+    "db.m6g.4xlarge": (64, 16),
+    "db.m6i.large": (8, 2),
+    "db.m6i.xlarge": (16, 4),
+    "db.m6i.2xlarge": (32, 8),
+    "db.m6i.4xlarge": (64, 16),
+    "db.r5.large": (16, 2),
+    "db.r5.xlarge": (32, 4),
+    "db.r5.2xlarge": (64, 8),
+    "db.r5.4xlarge": (128, 16),
+    "db.r6g.large": (16, 2),
+    "db.r6g.xlarge": (32, 4),
+    "db.r6g.2xlarge": (64, 8),
+    "db.r6g.4xlarge": (128, 16),
+    "db.r6i.large": (16, 2),
+    "db.r6i.xlarge": (32, 4),
+    "db.r6i.2xlarge": (64, 8),
+    "db.r6i.4xlarge": (128, 16),
+}
+
+PROFILES = ("durability", "throughput")
+
+# parameters that only take effect after a reboot
+STATIC_PARAMETERS = {
+    "innodb_buffer_pool_size",
+    "innodb_log_file_size",
+    "query_cache_type",
+}
+
+
+# memory the OS and the RDS processes keep; DBInstanceClassMemory is already
+# below the nominal class memory, so the tuning starts from what is left
+OS_RESERVE_MIN = 256 * MIB
+OS_RESERVE_SHARE = 0.1
+BUFFER_POOL_CHUNK = 128 * MIB
+# about 12 MiB of session buffers per connection
+CONNECTION_MEMORY = 12 * MIB
+MIN_CONNECTIONS = 50
+MAX_CONNECTIONS = 16000
+
+
+def _clamp(value, low, high):
+    return max(low, min(value, high))
+
+
+def usable_memory(instance_class):
+    """Bytes of `instance_class` memory left for MariaDB after the OS and RDS reserve."""
+    memory = INSTANCE_CLASSES[instance_class][0] * GIB
+    return memory - max(OS_RESERVE_MIN, int(memory * OS_RESERVE_SHARE))
+
+
+def tuned_values(instance_class, profile="durability"):
+    """Parameter name -> value for a MariaDB instance of `instance_class`.
+
+    Buffer pool, query cache and max_connections x CONNECTION_MEMORY together
+    stay within `usable_memory`.
+    """
+    if instance_class not in INSTANCE_CLASSES:
+        raise ValueError("no tuning data for %s, add it to INSTANCE_CLASSES" % instance_class)
+    if profile not in PROFILES:
+        raise ValueError("unknown tuning profile %r, expected one of %s" % (profile, ", ".join(PROFILES)))
+    memory_gib, vcpus = INSTANCE_CLASSES[instance_class]
+    usable = usable_memory(instance_class)
+
+    # the query cache serializes on a global mutex, so it only helps on tiny classes
+    query_cache = 16 * MIB if memory_gib <= 2 else 0
+
+    # small classes need more of their memory for connections; the buffer pool
+    # gives way to the MIN_CONNECTIONS floor and is kept a multiple of its chunk size
+    share = 0.5 if memory_gib < 4 else 0.75
+    buffer_pool = min(int(usable * share), usable - query_cache - MIN_CONNECTIONS * CONNECTION_MEMORY)
+    buffer_pool = max(buffer_pool // BUFFER_POOL_CHUNK * BUFFER_POOL_CHUNK, BUFFER_POOL_CHUNK)
+
+    redo_log = _clamp(buffer_pool // 4, 128 * MIB, 2 * GIB)
+    if profile == "throughput":
+        redo_log = _clamp(redo_log * 2, 256 * MIB, 4 * GIB)
+
+    # no innodb_buffer_pool_instances: MariaDB 10.6 removed it (mariadb10.6 parameter groups reject it)
+    return {
+        "innodb_buffer_pool_size": buffer_pool,
+        # whatever the buffer pool and the query cache leave
+        "max_connections": min((usable - buffer_pool - query_cache) // CONNECTION_MEMORY, MAX_CONNECTIONS),
+        "innodb_log_file_size": redo_log,
+        "innodb_flush_log_at_trx_commit": 1 if profile == "durability" else 2,
+        "sync_binlog": 1 if profile == "durability" else 0,
+        "query_cache_type": 1 if query_cache else 0,
+        "query_cache_size": query_cache,
+        "thread_cache_size": _clamp(vcpus * 8, 16, 256),
+    }
+
+
+def mariadb_parameters(instance_class, profile="durability", overrides=None):
+    """`parameters` argument for aws.rds.ParameterGroup; `overrides` wins over tuned values."""
+    values = tuned_values(instance_class, profile)
+    values.update(overrides or {})
+    return [{
+        'name': name,
+        'value': str(value),
+        'apply_method': 'pending-reboot' if name in STATIC_PARAMETERS else 'immediate',
+    } for name, value in sorted(values.items())]
+
+
+def max_connections(instance_class, profile="durability", overrides=None):
+    """The max_connections the parameter group sets, as a number for alarm thresholds.
+
+    An override that is an RDS formula, e.g. {DBInstanceClassMemory/12582880},
+    can't be evaluated here, so the tuned value stands in for it.
+    """
+    value = (overrides or {}).get("max_connections")
+    if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+        return int(value)
+    return tuned_values(instance_class, profile)["max_connections"]
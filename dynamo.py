@@ -0,0 +1,149 @@
+"""The TrackEmail table, driven by the `dynamoDB` and `dax` stack config.
+
+Lookups other than by `submission_id` go through config-declared global
+secondary indexes instead of scans, and rows carrying the TTL attribute (epoch
+seconds) are expired by DynamoDB. The table stays on-demand by default;
+PROVISIONED mode adds target tracking on read and write capacity for the
+table and each index. DAX is created in the program itself since it needs the
+VPC, see `dax_settings`.
+"""
+
+import pulumi
+import pulumi_aws as aws
+
+DEFAULTS = {
+    "billingMode": "PAY_PER_REQUEST",
+    # items without the attribute never expire; None turns TTL off
+    "ttlAttribute": "expires_at",
+    # e.g. [{"name": "by-user", "hashKey": "user_email", "rangeKey": "created_at"}]
+    "globalSecondaryIndexes": [],
+    # key attribute -> S, N or B; keys not listed are strings
+    "attributeTypes": {},
+    # PROVISIONED only, applied to the table and to each index
+    "readCapacity": {"min": 5, "max": 100, "targetUtilization": 70},
+    "writeCapacity": {"min": 5, "max": 100, "targetUtilization": 70},
+}
+
+DAX_DEFAULTS = {
+    "enabled": False,
+    "nodeType": "dax.t3.small",
+    # one node per AZ for more than one
+    "nodes": 1,
+    # seconds items and query results stay cached
+    "itemTtl": 300,
+    "queryTtl": 300,
+}
+
+HASH_KEY = "submission_id"
+PROJECTIONS = ("ALL", "KEYS_ONLY", "INCLUDE")
+
+
+def table_settings(overrides, profile=None):
+    """Merge the `dynamoDB` config object over the sizing profile's dynamoDB section and DEFAULTS."""
+    defaults = dict(DEFAULTS, **(profile or {}))
+    settings = dict(defaults, **(overrides or {}))
+    if settings["billingMode"] not in ("PAY_PER_REQUEST", "PROVISIONED"):
+        raise ValueError("dynamoDB.billingMode must be PAY_PER_REQUEST or PROVISIONED, got %r"
+                         % settings["billingMode"])
+    for name in ("readCapacity", "writeCapacity"):
+        settings[name] = dict(defaults[name], **(overrides or {}).get(name, {}))
+    for index in settings["globalSecondaryIndexes"]:
+        if index.get("projection", "ALL") not in PROJECTIONS:
+            raise ValueError("dynamoDB index %s: projection must be one of %s"
+                             % (index["name"], ", ".join(PROJECTIONS)))
+    return settings
+
+
+def dax_settings(overrides):
+    """Merge the `dax` config object over DAX_DEFAULTS."""
+    return dict(DAX_DEFAULTS, **(overrides or {}))
+
+
+def table_args(settings, replica_regions=()):
+    """Keyword arguments for aws.dynamodb.Table beyond the name.
+
+    `replica_regions` makes it a global table with a replica in each region.
+    """
+    provisioned = settings["billingMode"] == "PROVISIONED"
+    read_units = settings["readCapacity"]["min"] if provisioned else None
+    write_units = settings["writeCapacity"]["min"] if provisioned else None
+
+    # DynamoDB only accepts attribute definitions for key attributes
+    key_names = [HASH_KEY]
+    indexes = []
+    for index in settings["globalSecondaryIndexes"]:
+        key_names += [index["hashKey"]] + ([index["rangeKey"]] if index.get("rangeKey") else [])
+        indexes.append({
+            'name': index["name"],
+            'hash_key': index["hashKey"],
+            'range_key': index.get("rangeKey"),
+            'projection_type': index.get("projection", "ALL"),
+            'non_key_attributes': index.get("nonKeyAttributes"),
+            'read_capacity': read_units,
+            'write_capacity': write_units,
+        })
+
+    args = {
+        'attributes': [{
+            'name': name,
+            'type': settings["attributeTypes"].get(name, "S"),
+        } for name in sorted(set(key_names))],
+        'hash_key': HASH_KEY,
+        'billing_mode': settings["billingMode"],
+        'read_capacity': read_units,
+        'write_capacity': write_units,
+        'global_secondary_indexes': indexes or None,
+        'ttl': {'attribute_name': settings["ttlAttribute"], 'enabled': True}
+        if settings["ttlAttribute"] else None,
+    }
+    if replica_regions:
+        # global tables replicate through the table stream
+        args.update({
+            'replicas': [{'region_name': region} for region in replica_regions],
+            'stream_enabled': True,
+            'stream_view_type': "NEW_AND_OLD_IMAGES",
+        })
+    if provisioned:
+        # auto scaling moves the capacities after creation
+        args['opts'] = pulumi.ResourceOptions(ignore_changes=[
+            "readCapacity", "writeCapacity",
+            "globalSecondaryIndexes[*].readCapacity", "globalSecondaryIndexes[*].writeCapacity",
+        ])
+    return args
+
+
+def create_table_autoscaling(table, settings):
+    """Target tracking on consumed read and write capacity for the table and its indexes."""
+    if settings["billingMode"] != "PROVISIONED":
+        return []
+    resources = [("table", None)] + [("index", index["name"])
+                                     for index in settings["globalSecondaryIndexes"]]
+    targets = []
+    for kind, index_name in resources:
+        if index_name:
+            resource_id = pulumi.Output.concat("table/", table.name, "/index/", index_name)
+            suffix = "-" + index_name
+        else:
+            resource_id = pulumi.Output.concat("table/", table.name)
+            suffix = ""
+        for mode, capacity in (("Read", settings["readCapacity"]), ("Write", settings["writeCapacity"])):
+            target = aws.appautoscaling.Target("dynamo%sTarget%s" % (mode, suffix),
+                service_namespace="dynamodb",
+                scalable_dimension="dynamodb:%s:%sCapacityUnits" % (kind, mode),
+                resource_id=resource_id,
+                min_capacity=capacity["min"],
+                max_capacity=capacity["max"])
+
+            aws.appautoscaling.Policy("dynamo%sTracking%s" % (mode, suffix),
+                policy_type="TargetTrackingScaling",
+                service_namespace=target.service_namespace,
+                scalable_dimension=target.scalable_dimension,
+                resource_id=target.resource_id,
+                target_tracking_scaling_policy_configuration={
+                    'predefined_metric_specification': {
+                        'predefined_metric_type': "DynamoDB%sCapacityUtilization" % mode,
+                    },
+                    'target_value': capacity["targetUtilization"],
+                })
+            targets.append(target)
+    return targets
@@ -0,0 +1,75 @@
+"""Instance types for the web app group: single type, or a mixed On-Demand/Spot fleet.
+
+Driven by the `instanceTypes` and `spot` stack config. Graviton (arm64) types
+are launched from their own launch template so they get an arm64 AMI.
+"""
+
+import re
+
+SPOT_DEFAULTS = {
+    # instances that are always On-Demand
+    "onDemandBaseCapacity": 1,
+    # share of capacity above the base that is On-Demand, the rest is Spot
+    "onDemandPercentageAboveBase": 100,
+    "allocationStrategy": "capacity-optimized",
+}
+
+ARCHITECTURES = ("x86_64", "arm64")
+
+
+def architecture_of(instance_type):
+    """Graviton families carry a `g` after the generation (t4g, m7g, c6gn), plus the original a1."""
+    family = instance_type.split(".")[0]
+    return "arm64" if family == "a1" or re.match(r"^[a-z]+\d+g", family) else "x86_64"
+
+
+def instance_type_overrides(types):
+    """Normalize `instanceTypes` entries (a type name or {"type", "architecture", "weight"})."""
+    overrides = []
+    for entry in types or []:
+        if isinstance(entry, str):
+            entry = {"type": entry}
+        architecture = entry.get("architecture") or architecture_of(entry["type"])
+        if architecture not in ARCHITECTURES:
+            raise ValueError("unknown architecture %r for %s" % (architecture, entry["type"]))
+        overrides.append({
+            "type": entry["type"],
+            "architecture": architecture,
+            "weight": entry.get("weight"),
+        })
+    return overrides
+
+
+def spot_settings(overrides):
+    """Merge the `spot` config object over SPOT_DEFAULTS."""
+    return dict(SPOT_DEFAULTS, **(overrides or {}))
+
+
+def mixed_instances_policy(launch_templates, overrides, spot):
+    """`mixed_instances_policy` argument for the group.
+
+    `launch_templates` maps an architecture to its launch template; the x86_64
+    one is the default and the others are attached to their overrides.
+    """
+    default = launch_templates["x86_64"]
+    return {
+        'launch_template': {
+            'launch_template_specification': {
+                'launch_template_id': default.id,
+                'version': '$Latest',
+            },
+            'overrides': [{
+                'instance_type': override["type"],
+                'weighted_capacity': str(override["weight"]) if override["weight"] else None,
+                'launch_template_specification': {
+                    'launch_template_id': launch_templates[override["architecture"]].id,
+                    'version': '$Latest',
+                } if override["architecture"] != "x86_64" else None,
+            } for override in overrides],
+        },
+        'instances_distribution': {
+            'on_demand_base_capacity': spot["onDemandBaseCapacity"],
+            'on_demand_percentage_above_base_capacity': spot["onDemandPercentageAboveBase"],
+            'spot_allocation_strategy': spot["allocationStrategy"],
+        },
+    }
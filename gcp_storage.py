@@ -0,0 +1,23 @@
+"""GCP service account (and its key) the Lambda stores submissions in Cloud Storage with."""
+
+import pulumi
+import pulumi_gcp as gcp
+
+gcp_config = pulumi.Config("gcp")
+projectId = gcp_config.require("project")
+
+### Create a new Google Service Account
+service_account = gcp.serviceaccount.Account("CSYE6225sw-storage",
+    account_id="csye6225sw-storage",
+    display_name="CSYE6225sw-storage")
+
+### Binding Role for service account
+storage_object_user_role_binding = gcp.projects.IAMBinding("storage-object-user-role-binding",
+    role="roles/storage.objectUser",
+    project=projectId,
+    members=[pulumi.Output.concat("serviceAccount:", service_account.email)],
+)
+
+### Create a new key for the service account
+service_account_key = gcp.serviceaccount.Key("CSYE6225sw-key",
+    service_account_id=service_account.name)
@@ -0,0 +1,246 @@
+"""CloudWatch agent config, dashboard and alarms, driven by the `monitoring` stack config.
+
+The agent config is generated here and stored in SSM Parameter Store under an
+`AmazonCloudWatch-` name, which CloudWatchAgentServerPolicy already lets the
+instances read. Memory, disk and netstat metrics are aggregated per auto
+scaling group at `metricsResolution` seconds (below 60 they are stored as
+high-resolution metrics), and the app log files go to one log group.
+"""
+
+import json
+
+import pulumi
+import pulumi_aws as aws
+
+DEFAULTS = {
+    # False keeps the /opt/amazon-cloudwatch-config.json baked into the AMI
+    "generateAgentConfig": True,
+    # seconds; 1, 5, 10 or 30 for high-resolution metrics, or 60
+    "metricsResolution": 60,
+    "appLogFiles": ["/var/log/webapp/*.log"],
+    "logRetentionDays": 14,
+    # SNS topic ARN notified by the alarms; None leaves them without actions
+    "alarmTopicArn": None,
+    "latencyP50Threshold": 0.3,
+    "latencyP99Threshold": 1.0,
+    # percent of requests
+    "error5xxThreshold": 5,
+    "rdsCpuThreshold": 80,
+    # percent of max_connections
+    "rdsConnectionsThreshold": 80,
+    # percent of the function timeout
+    "lambdaDurationThreshold": 80,
+}
+
+RESOLUTIONS = (1, 5, 10, 30, 60)
+AGENT_NAMESPACE = "CWAgent"
+
+
+def monitoring_settings(overrides):
+    """Merge the `monitoring` config object over DEFAULTS."""
+    settings = dict(DEFAULTS, **(overrides or {}))
+    if settings["metricsResolution"] not in RESOLUTIONS:
+        raise ValueError("monitoring.metricsResolution must be one of %s, got %r"
+                         % (", ".join(map(str, RESOLUTIONS)), settings["metricsResolution"]))
+    return settings
+
+
+def agent_config(settings, log_group_name):
+    """CloudWatch agent JSON config for the app instances."""
+    return {
+        "agent": {
+            "metrics_collection_interval": settings["metricsResolution"],
+            "run_as_user": "root",
+        },
+        "metrics": {
+            "namespace": AGENT_NAMESPACE,
+            "append_dimensions": {
+                "AutoScalingGroupName": "${aws:AutoScalingGroupName}",
+                "InstanceId": "${aws:InstanceId}",
+            },
+            # the dashboard and alarms read the per-group aggregates
+            "aggregation_dimensions": [["AutoScalingGroupName"]],
+            "metrics_collected": {
+                "mem": {"measurement": ["mem_used_percent"]},
+                "disk": {"measurement": ["used_percent"], "resources": ["/"]},
+                "netstat": {"measurement": ["tcp_established", "tcp_time_wait"]},
+            },
+        },
+        "logs": {
+            "logs_collected": {
+                "files": {
+                    "collect_list": [{
+                        "file_path": path,
+                        "log_group_name": log_group_name,
+                        "log_stream_name": "{instance_id}",
+                    } for path in settings["appLogFiles"]],
+                },
+            },
+        },
+    }
+
+
+def create_agent_config(settings, name_suffix):
+    """Log group and SSM parameter holding the agent config; returns the parameter."""
+    log_group = aws.cloudwatch.LogGroup("webAppLogGroup",
+        name="/webapp/" + name_suffix,
+        retention_in_days=settings["logRetentionDays"])
+
+    return aws.ssm.Parameter("cloudWatchAgentConfig",
+        # CloudWatchAgentServerPolicy allows ssm:GetParameter on AmazonCloudWatch-*
+        name="AmazonCloudWatch-" + name_suffix,
+        type="String",
+        tier="Standard",
+        value=log_group.name.apply(lambda name: json.dumps(agent_config(settings, name))))
+
+
+def _metric_widget(title, metrics, x, y, stat="Average", period=60, region=None):
+    return {
+        "type": "metric",
+        "x": x,
+        "y": y,
+        "width": 12,
+        "height": 6,
+        "properties": {
+            "title": title,
+            "metrics": metrics,
+            "stat": stat,
+            "period": period,
+            "region": region,
+            "view": "timeSeries",
+        },
+    }
+
+
+def create_dashboard_and_alarms(settings, region, resources):
+    """Dashboard and alarms over the ALB, RDS, Lambda and auto scaling group.
+
+    `resources` holds the Outputs the metrics are dimensioned by: load_balancer
+    (ARN suffix), db_instance (identifier), function (name) and
+    auto_scaling_group (name), plus max_connections and lambda_timeout as
+    plain numbers. function and lambda_timeout are None without a Lambda.
+    """
+    resolution = settings["metricsResolution"]
+
+    def dashboard_body(args):
+        lb, db, function, group = args
+        widgets = [
+            _metric_widget("ALB target response time", [
+                ["AWS/ApplicationELB", "TargetResponseTime", "LoadBalancer", lb, {"stat": "p50", "label": "p50"}],
+                ["...", {"stat": "p99", "label": "p99"}],
+            ], 0, 0, region=region),
+            _metric_widget("ALB 5xx rate (%)", [
+                [{"expression": "100 * (e1 + e2) / r", "label": "5xx %", "id": "rate"}],
+                ["AWS/ApplicationELB", "HTTPCode_Target_5XX_Count", "LoadBalancer", lb, {"id": "e1", "visible": False}],
+                [".", "HTTPCode_ELB_5XX_Count", ".", ".", {"id": "e2", "visible": False}],
+                [".", "RequestCount", ".", ".", {"id": "r", "visible": False}],
+            ], 12, 0, stat="Sum", region=region),
+            _metric_widget("RDS", [
+                ["AWS/RDS", "DatabaseConnections", "DBInstanceIdentifier", db],
+                [".", "CPUUtilization", ".", ".", {"yAxis": "right"}],
+            ], 0, 6, region=region),
+            _metric_widget("Auto scaling group capacity", [
+                ["AWS/AutoScaling", "GroupInServiceInstances", "AutoScalingGroupName", group],
+                [".", "GroupDesiredCapacity", ".", "."],
+                [".", "GroupPendingInstances", ".", "."],
+            ], 12, 6, region=region),
+            _metric_widget("App instances", [
+                [AGENT_NAMESPACE, "mem_used_percent", "AutoScalingGroupName", group],
+                [".", "disk_used_percent", ".", "."],
+                [".", "netstat_tcp_established", ".", ".", {"yAxis": "right"}],
+            ], 0, 12, period=resolution, region=region),
+        ]
+        if function:
+            widgets.append(_metric_widget("Lambda", [
+                ["AWS/Lambda", "Duration", "FunctionName", function, {"stat": "p99", "label": "duration p99"}],
+                [".", "Throttles", ".", ".", {"stat": "Sum", "yAxis": "right"}],
+                [".", "Errors", ".", ".", {"stat": "Sum", "yAxis": "right"}],
+            ], 12, 12, region=region))
+        return json.dumps({"widgets": widgets})
+
+    aws.cloudwatch.Dashboard("performanceDashboard",
+        dashboard_name="webapp-performance-" + pulumi.get_stack(),
+        dashboard_body=pulumi.Output.all(resources["load_balancer"], resources["db_instance"],
+                                         resources["function"], resources["auto_scaling_group"]).apply(dashboard_body))
+
+    actions = [settings["alarmTopicArn"]] if settings["alarmTopicArn"] else []
+
+    def alarm(name, metric_name, namespace, dimensions, threshold, statistic=None,
+              extended_statistic=None, evaluation_periods=3):
+        return aws.cloudwatch.MetricAlarm(name,
+            metric_name=metric_name,
+            namespace=namespace,
+            dimensions=dimensions,
+            statistic=statistic,
+            extended_statistic=extended_statistic,
+            comparison_operator="GreaterThanThreshold",
+            threshold=threshold,
+            period=60,
+            evaluation_periods=evaluation_periods,
+            treat_missing_data="notBreaching",
+            alarm_actions=actions,
+            ok_actions=actions)
+
+    lb_dimensions = {"LoadBalancer": resources["load_balancer"]}
+    alarm("AlbLatencyP50Alarm", "TargetResponseTime", "AWS/ApplicationELB", lb_dimensions,
+          settings["latencyP50Threshold"], extended_statistic="p50")
+    alarm("AlbLatencyP99Alarm", "TargetResponseTime", "AWS/ApplicationELB", lb_dimensions,
+          settings["latencyP99Threshold"], extended_statistic="p99")
+
+    aws.cloudwatch.MetricAlarm("Alb5xxRateAlarm",
+        comparison_operator="GreaterThanThreshold",
+        threshold=settings["error5xxThreshold"],
+        evaluation_periods=3,
+        treat_missing_data="notBreaching",
+        alarm_actions=actions,
+        ok_actions=actions,
+        metric_queries=[
+            {"id": "rate", "expression": "100 * (e1 + e2) / r", "label": "5xx %", "return_data": True},
+        ] + [{
+            "id": query_id,
+            "metric": {
+                "metric_name": metric_name,
+                "namespace": "AWS/ApplicationELB",
+                "dimensions": lb_dimensions,
+                "period": 60,
+                "stat": "Sum",
+            },
+        } for query_id, metric_name in (("e1", "HTTPCode_Target_5XX_Count"),
+                                        ("e2", "HTTPCode_ELB_5XX_Count"),
+                                        ("r", "RequestCount"))])
+
+    db_dimensions = {"DBInstanceIdentifier": resources["db_instance"]}
+    alarm("RdsCpuAlarm", "CPUUtilization", "AWS/RDS", db_dimensions,
+          settings["rdsCpuThreshold"], statistic="Average")
+    alarm("RdsConnectionsAlarm", "DatabaseConnections", "AWS/RDS", db_dimensions,
+          resources["max_connections"] * settings["rdsConnectionsThreshold"] // 100, statistic="Maximum")
+
+    if resources["function"]:
+        function_dimensions = {"FunctionName": resources["function"]}
+        alarm("LambdaDurationAlarm", "Duration", "AWS/Lambda", function_dimensions,
+              resources["lambda_timeout"] * 1000 * settings["lambdaDurationThreshold"] // 100,
+              extended_statistic="p99")
+        alarm("LambdaThrottlesAlarm", "Throttles", "AWS/Lambda", function_dimensions, 0,
+              statistic="Sum", evaluation_periods=1)
+
+    # in-service below desired for 5 minutes: instances failing to launch or pass health checks
+    aws.cloudwatch.MetricAlarm("AsgCapacityAlarm",
+        comparison_operator="LessThanThreshold",
+        threshold=0,
+        evaluation_periods=5,
+        treat_missing_data="notBreaching",
+        alarm_actions=actions,
+        ok_actions=actions,
+        metric_queries=[
+            {"id": "gap", "expression": "m1 - m2", "label": "in service - desired", "return_data": True},
+        ] + [{
+            "id": query_id,
+            "metric": {
+                "metric_name": metric_name,
+                "namespace": "AWS/AutoScaling",
+                "dimensions": {"AutoScalingGroupName": resources["auto_scaling_group"]},
+                "period": 60,
+                "stat": "Average",
+            },
+        } for query_id, metric_name in (("m1", "GroupInServiceInstances"),
+                                        ("m2", "GroupDesiredCapacity"))])
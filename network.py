@@ -0,0 +1,260 @@
+"""VPC, subnets, routing, NAT, VPC endpoints and the load balancer and app security groups."""
+
+import pulumi
+import pulumi_aws as aws
+from dynamo import dax_settings
+from subnets import SubnetAllocator
+from stack_config import (appSecurityGroup, aws_region, config, destinationCidrBlock,
+                          internetGatewayName, privateRouteTableName, privateSubnetsName,
+                          publicRouteTableName, publicSubnetAssoName, publicSubnetsName,
+                          vpcCidrBlock, vpcName)
+
+# get AZ
+available_az = aws.get_availability_zones(state="available").names
+az_count = len(available_az)
+pulumi.info(str(available_az[0]))
+
+# get the number of subnets create
+ind_range = min(config.get_int("subnetAzCount") or 3, az_count)
+
+# carve subnet blocks per tier, e.g. subnetPrefixLengths: {"public": 24, "private": 23}
+subnet_allocator = SubnetAllocator(vpcCidrBlock, config.get_object("subnetPrefixLengths"), 2 * ind_range)
+public_cidrs = subnet_allocator.allocate("public", ind_range)
+private_cidrs = subnet_allocator.allocate("private", ind_range)
+
+### create VPC
+vpc = aws.ec2.Vpc(vpcName,
+    cidr_block = vpcCidrBlock,
+    instance_tenancy = "default",
+    enable_dns_hostnames=True,
+    
+    tags = {
+        "Name": vpcName,
+    })
+
+### internet getway
+internet_gateway = aws.ec2.InternetGateway(internetGatewayName,
+    vpc_id = vpc.id,
+    tags={
+        "Name": internetGatewayName,
+    })
+
+### app instances go in every public subnet, or every private subnet behind a NAT gateway
+asgSubnetTier = config.get("asgSubnetTier") or "public"
+if asgSubnetTier not in ("public", "private"):
+    raise ValueError("asgSubnetTier must be 'public' or 'private', got %r" % asgSubnetTier)
+
+# a Lambda in the VPC (for DAX) also reaches Mailgun and GCS through the NAT gateway
+dax_config = dax_settings(config.get_object("dax"))
+
+# "single": one NAT gateway in the first public subnet serves every AZ. That
+# is one gateway's hourly charge, but private subnets lose internet access when
+# its AZ goes down, and traffic from the other AZs pays cross-AZ data transfer.
+# "perAz": a NAT gateway and a private route table in every AZ.
+natGateways = config.get("natGateways") or "single"
+if natGateways not in ("single", "perAz"):
+    raise ValueError("natGateways must be 'single' or 'perAz', got %r" % natGateways)
+nat_needed = asgSubnetTier == "private" or dax_config["enabled"]
+
+### public and private route table
+public_route_table = aws.ec2.RouteTable(publicRouteTableName, vpc_id=vpc.id,
+                                        tags={"Name": publicRouteTableName})
+
+private_route_table = aws.ec2.RouteTable(privateRouteTableName, vpc_id=vpc.id,
+                                        tags={"Name": privateRouteTableName})
+# one private route table per AZ with per-AZ NAT gateways; the first AZ keeps the original one
+private_route_tables = [private_route_table]
+if nat_needed and natGateways == "perAz":
+    private_route_tables += [aws.ec2.RouteTable(privateRouteTableName + str(az_index), vpc_id=vpc.id,
+                                                tags={"Name": privateRouteTableName + str(az_index)})
+                             for az_index in range(1, ind_range)]
+
+#save subnets created in list
+created_publicsubnets =[]
+created_publicsubnetsIds=[]
+created_privatesubnets =[]
+created_privatesubnetsIds= []
+
+### create public subnets
+for az_index in range(ind_range):
+    public_subnet = aws.ec2.Subnet(publicSubnetsName + str(az_index),
+                                  availability_zone = available_az[az_index],
+                                  vpc_id=vpc.id,
+                                  cidr_block = str(public_cidrs[az_index]),
+                                  map_public_ip_on_launch=True,
+                                  tags={"Name": publicSubnetsName + str(az_index)})
+    
+    created_publicsubnets.append(public_subnet)
+    created_publicsubnetsIds.append(public_subnet.id)
+    public_association = aws.ec2.RouteTableAssociation(publicSubnetAssoName+str(az_index),
+                                                       route_table_id=public_route_table.id,
+                                                       subnet_id=public_subnet.id)
+    
+### create private subnets
+for az_index in range(ind_range):
+    private_subnet = aws.ec2.Subnet(privateSubnetsName+str(az_index),
+                                    availability_zone = available_az[az_index],
+                                    vpc_id=vpc.id,
+                                    cidr_block=str(private_cidrs[az_index]),
+                                    tags={"Name":privateSubnetsName+str(az_index)})
+    
+    # the AZ's own route table, or the shared one
+    private_route_table_of_az = private_route_tables[min(az_index, len(private_route_tables) - 1)]
+    private_association = aws.ec2.RouteTableAssociation(privateSubnetsName+str(az_index),
+                                                       route_table_id=private_route_table_of_az.id,
+                                                       subnet_id=private_subnet.id)
+    
+    created_privatesubnets.append(private_subnet)
+    created_privatesubnetsIds.append(private_subnet.id)
+
+### Create a DB Subnet Group
+db_subnet_group = aws.rds.SubnetGroup("my-db-subnet-group",
+    subnet_ids=created_privatesubnetsIds,
+    description="private DB subnet group for rds"
+)
+    
+### add public cidr destination and gateway
+public_route = aws.ec2.Route(
+    "public-route",
+    route_table_id=public_route_table.id,
+    destination_cidr_block=destinationCidrBlock,
+    gateway_id=internet_gateway.id,
+)
+
+app_subnetIds = created_publicsubnetsIds
+if nat_needed:
+    # the first AZ's gateway keeps the names of the single-NAT layout
+    for az_index, route_table in enumerate(private_route_tables):
+        suffix = str(az_index) if az_index else ""
+        nat_eip = aws.ec2.Eip("natGatewayEip" + suffix, domain="vpc",
+                              tags={"Name": vpcName + "-nat" + suffix})
+
+        # a NAT gateway only works once the internet gateway is attached
+        nat_gateway = aws.ec2.NatGateway("natGateway" + suffix,
+            opts=pulumi.ResourceOptions(depends_on=[internet_gateway]),
+            allocation_id=nat_eip.id,
+            subnet_id=created_publicsubnets[az_index].id,
+            tags={"Name": vpcName + "-nat" + suffix})
+
+        private_route = aws.ec2.Route(
+            "private-route" + suffix,
+            route_table_id=route_table.id,
+            destination_cidr_block=destinationCidrBlock,
+            nat_gateway_id=nat_gateway.id,
+        )
+if asgSubnetTier == "private":
+    app_subnetIds = created_privatesubnetsIds
+
+### VPC endpoints keep AWS API traffic off the internet gateway and NAT
+vpc_endpoint_config = dict({
+    # free; added to every route table
+    "gateway": ["s3", "dynamodb"],
+    # billed per AZ and hour, e.g. ["sns", "monitoring", "logs"]
+    "interface": [],
+}, **(config.get_object("vpcEndpoints") or {}))
+
+for endpoint_service in vpc_endpoint_config["gateway"]:
+    aws.ec2.VpcEndpoint(endpoint_service + "GatewayEndpoint",
+        vpc_id=vpc.id,
+        service_name=f"com.amazonaws.{aws_region}.{endpoint_service}",
+        vpc_endpoint_type="Gateway",
+        route_table_ids=[public_route_table.id] + [route_table.id for route_table in private_route_tables],
+        tags={"Name": vpcName + "-" + endpoint_service})
+
+if vpc_endpoint_config["interface"]:
+    vpc_endpoint_sg = aws.ec2.SecurityGroup("vpcEndpointSecurityGroup",
+        description="interface endpoints, HTTPS from inside the VPC",
+        vpc_id=vpc.id,
+        ingress=[
+            {
+                "protocol": "tcp",
+                "from_port": 443,
+                "to_port": 443,
+                "cidr_blocks": [vpcCidrBlock],
+            }
+        ],
+        tags={"Name": "VpcEndpointSecurityGroup"})
+
+    for endpoint_service in vpc_endpoint_config["interface"]:
+        # private DNS points the regular service hostnames at the endpoint
+        aws.ec2.VpcEndpoint(endpoint_service + "InterfaceEndpoint",
+            vpc_id=vpc.id,
+            service_name=f"com.amazonaws.{aws_region}.{endpoint_service}",
+            vpc_endpoint_type="Interface",
+            private_dns_enabled=True,
+            subnet_ids=created_privatesubnetsIds,
+            security_group_ids=[vpc_endpoint_sg.id],
+            tags={"Name": vpcName + "-" + endpoint_service})
+
+
+### security group for load balancer
+load_balancer_sg = aws.ec2.SecurityGroup('LoadBalancerSecurityGroup',
+    description='Enable HTTP and HTTPS access',
+    vpc_id=vpc.id,
+    ingress=[
+        # HTTP access from anywhere
+        {'protocol': 'tcp', 'from_port': 80, 'to_port': 80, 'cidr_blocks': ['0.0.0.0/0']},
+        # HTTPS access from anywhere
+        {'protocol': 'tcp', 'from_port': 443, 'to_port': 443, 'cidr_blocks': ['0.0.0.0/0']},
+        
+    ], 
+    egress=[
+        # Allow all outbound traffic.
+        {
+            "protocol": "-1",
+            "from_port": 0,
+            "to_port": 0,
+            "cidr_blocks": ["0.0.0.0/0"],
+        }
+    ],
+    tags={
+        "Name": "load balancer security group",
+    })
+
+### security group for instance
+app_security_group = aws.ec2.SecurityGroup(appSecurityGroup,
+    description='EC2 security group for web applications',
+    vpc_id=vpc.id,
+    # ingress=[
+    #     # SSH
+    #     aws.ec2.SecurityGroupIngressArgs(
+    #         protocol='tcp',
+    #         from_port=22,
+    #         to_port=22,
+    #         # cidr_blocks=['0.0.0.0/0'],
+    #         source_security_group_id=load_balancer_sg.id,
+    #     ),
+    #     # HTTP
+    #     aws.ec2.SecurityGroupIngressArgs(
+    #         protocol='tcp',
+    #         from_port=80,
+    #         to_port=80,
+    #         # cidr_blocks=['0.0.0.0/0'],
+    #         source_security_group_id=load_balancer_sg.id,
+    #     ),
+        # HTTPS
+        # aws.ec2.SecurityGroupIngressArgs(
+        #     protocol='tcp',  
+        #     from_port=443,
+        #     to_port=443,
+        #     # cidr_blocks=['0.0.0.0/0'],
+        # ),
+        # Your application port (assuming it's 8080 for this example)
+        # aws.ec2.SecurityGroupIngressArgs(
+        #     protocol='tcp',
+        #     from_port=8080,
+        #     to_port=8080,
+        #     # cidr_blocks=['0.0.0.0/0'],
+        #     source_security_group_id=load_balancer_sg.id,
+        # )],
+    egress=[aws.ec2.SecurityGroupEgressArgs(
+        from_port=0,
+        to_port=0,
+        protocol="-1",
+        cidr_blocks=["0.0.0.0/0"],
+        ipv6_cidr_blocks=["::/0"],
+    )],
+     tags={ 
+        "Name": "Security group for ec2",
+    }
+)
@@ -0,0 +1,262 @@
+"""Extra regions of an active-active deployment, driven by the `regions` stack config.
+
+Each entry becomes a `RegionalWebApp` built through an explicit provider for
+its region. It holds a VPC with public and private subnets, a cross-region
+read replica of the database, and the app's launch templates, auto scaling
+group, scaling policies and ALB, built from the same arguments as the primary
+region's, which the rest of the program builds. Writes from every region go
+to the primary writer over VPC peering, see regions.py, and reads go to the
+local replica. Route 53 sends each user to the closest healthy region with
+latency records, see `latency_record_args`.
+"""
+
+import base64
+
+import pulumi
+import pulumi_aws as aws
+
+from scaling import create_scaling_policies
+from subnets import SubnetAllocator, find_overlaps
+
+DEFAULTS = {
+    # required: region, vpcCidrBlock, amiId (AMIs are regional) and certificateArn (so are certificates)
+    "azCount": 2,
+    # SSH key pairs are regional too; None launches without one
+    "keyName": None,
+    # arm64 AMI in the region, needed when instanceTypes has Graviton types
+    "amiIdArm64": None,
+}
+REQUIRED = ("region", "vpcCidrBlock", "amiId", "certificateArn")
+
+
+def region_settings(entries, primary_region, primary_cidr):
+    """Merge every `regions` entry over DEFAULTS and check regions and CIDRs don't collide."""
+    regions = []
+    for entry in entries or []:
+        missing = [key for key in REQUIRED if not entry.get(key)]
+        if missing:
+            raise ValueError("regions entry %r needs %s" % (entry.get("region"), ", ".join(missing)))
+        regions.append(dict(DEFAULTS, **entry))
+    names = [primary_region] + [settings["region"] for settings in regions]
+    if len(set(names)) != len(names):
+        raise ValueError("regions must differ from each other and from aws:region %s" % primary_region)
+    # VPC peering needs every VPC CIDR to be distinct
+    overlaps = find_overlaps([primary_cidr] + [settings["vpcCidrBlock"] for settings in regions])
+    if overlaps:
+        raise ValueError("region VPC CIDRs overlap: %s" % ", ".join("%s and %s" % pair for pair in overlaps))
+    return regions
+
+
+def latency_record_args(name, region, load_balancer, health_check_path):
+    """Latency routing and an HTTPS health check for the alias record of `load_balancer`.
+
+    Keyword arguments for aws.route53.Record beyond the zone, name, type and alias.
+    """
+    health_check = aws.route53.HealthCheck(name + "HealthCheck",
+        fqdn=load_balancer.dns_name,
+        port=443,
+        type="HTTPS",
+        resource_path=health_check_path,
+        request_interval=30,
+        failure_threshold=3,
+        tags={"Name": name + "-" + region})
+    return {
+        'set_identifier': region,
+        'latency_routing_policies': [{'region': region}],
+        'health_check_id': health_check.id,
+        # a latency record can't sit next to the simple record it replaces
+        'opts': pulumi.ResourceOptions(delete_before_replace=True),
+    }
+
+
+class RegionalWebApp(pulumi.ComponentResource):
+    """VPC, read replica, auto scaling group and ALB of the web app in one extra region.
+
+    `settings` is one `regions` entry. `app` carries what is shared with the
+    primary region: instance_type, architectures (of its launch templates),
+    group_name, db_instance_class, db_parameters, source_db_arn,
+    writer_endpoint, lb_config, scaling (the `autoScaling` settings) and
+    user_data, which builds the script from the writer and the reader
+    endpoints. launch_template_args, target_group_args and
+    auto_scaling_group_args are compute.py's builders of those arguments, so
+    every region gets the primary's root volume, instance types, warm pool and
+    group settings.
+    """
+
+    def __init__(self, name, settings, app, opts=None):
+        super().__init__("csye6225:index:RegionalWebApp", name, None, opts)
+        child = pulumi.ResourceOptions(parent=self)
+        region = settings["region"]
+
+        available_az = aws.get_availability_zones(state="available",
+            opts=pulumi.InvokeOptions(parent=self)).names
+        az_count = min(settings["azCount"], len(available_az))
+        allocator = SubnetAllocator(settings["vpcCidrBlock"], subnet_count=2 * az_count)
+        public_cidrs = allocator.allocate("public", az_count)
+        private_cidrs = allocator.allocate("private", az_count)
+
+        self.vpc = aws.ec2.Vpc(name + "-vpc",
+            opts=child,
+            cidr_block=settings["vpcCidrBlock"],
+            enable_dns_hostnames=True,
+            tags={"Name": name + "-vpc"})
+
+        internet_gateway = aws.ec2.InternetGateway(name + "-igw",
+            opts=child,
+            vpc_id=self.vpc.id,
+            tags={"Name": name + "-igw"})
+
+        self.public_route_table = aws.ec2.RouteTable(name + "-public-route-table",
+            opts=child,
+            vpc_id=self.vpc.id,
+            routes=[{"cidr_block": "0.0.0.0/0", "gateway_id": internet_gateway.id}],
+            tags={"Name": name + "-public-route-table"})
+        # no internet route: only the read replica lives in the private subnets
+        self.private_route_table = aws.ec2.RouteTable(name + "-private-route-table",
+            opts=child,
+            vpc_id=self.vpc.id,
+            tags={"Name": name + "-private-route-table"})
+
+        public_subnets = []
+        private_subnets = []
+        for az_index in range(az_count):
+            for tier, cidrs, route_table, subnets in (
+                    ("public", public_cidrs, self.public_route_table, public_subnets),
+                    ("private", private_cidrs, self.private_route_table, private_subnets)):
+                subnet = aws.ec2.Subnet("%s-%s-subnet%d" % (name, tier, az_index),
+                    opts=child,
+                    vpc_id=self.vpc.id,
+                    availability_zone=available_az[az_index],
+                    cidr_block=str(cidrs[az_index]),
+                    map_public_ip_on_launch=tier == "public",
+                    tags={"Name": "%s-%s-subnet%d" % (name, tier, az_index)})
+                aws.ec2.RouteTableAssociation("%s-%s-association%d" % (name, tier, az_index),
+                    opts=child,
+                    route_table_id=route_table.id,
+                    subnet_id=subnet.id)
+                subnets.append(subnet.id)
+
+        ### security groups: load balancer, app instances and the read replica
+        all_outbound = [{
+            # Allow all outbound traffic.
+            "protocol": "-1",
+            "from_port": 0,
+            "to_port": 0,
+            "cidr_blocks": ["0.0.0.0/0"],
+        }]
+        load_balancer_sg = aws.ec2.SecurityGroup(name + "-lb-sg",
+            opts=child,
+            description="Enable HTTP and HTTPS access",
+            vpc_id=self.vpc.id,
+            ingress=[
+                {"protocol": "tcp", "from_port": 80, "to_port": 80, "cidr_blocks": ["0.0.0.0/0"]},
+                {"protocol": "tcp", "from_port": 443, "to_port": 443, "cidr_blocks": ["0.0.0.0/0"]},
+            ],
+            egress=all_outbound,
+            tags={"Name": name + " load balancer security group"})
+        app_security_group = aws.ec2.SecurityGroup(name + "-app-sg",
+            opts=child,
+            description="EC2 security group for web applications",
+            vpc_id=self.vpc.id,
+            ingress=[
+                {"protocol": "tcp", "from_port": 8080, "to_port": 8080,
+                 "security_groups": [load_balancer_sg.id]},
+            ],
+            egress=all_outbound,
+            tags={"Name": name + " security group for ec2"})
+        database_security_group = aws.ec2.SecurityGroup(name + "-db-sg",
+            opts=child,
+            description="read replica security group",
+            vpc_id=self.vpc.id,
+            ingress=[
+                {"protocol": "tcp", "from_port": 3306, "to_port": 3306,
+                 "security_groups": [app_security_group.id]},
+            ],
+            egress=all_outbound,
+            tags={"Name": name + " read replica security group"})
+
+        ### cross-region read replica; parameter groups are regional, so it gets its own copy
+        db_subnet_group = aws.rds.SubnetGroup(name + "-db-subnet-group",
+            opts=child,
+            subnet_ids=private_subnets,
+            description="private DB subnet group for the read replica")
+        db_parameter_group = aws.rds.ParameterGroup(name + "-db-param-group",
+            opts=child,
+            family="mariadb10.6",
+            description="Custom Parameter Group for CSYE6225",
+            parameters=app["db_parameters"])
+        self.read_replica = aws.rds.Instance(name + "-replica",
+            opts=child,
+            replicate_source_db=app["source_db_arn"],
+            instance_class=app["db_instance_class"],
+            db_subnet_group_name=db_subnet_group.name,
+            parameter_group_name=db_parameter_group.name,
+            vpc_security_group_ids=[database_security_group.id],
+            skip_final_snapshot=True)
+
+        user_data = pulumi.Output.all(app["writer_endpoint"], self.read_replica.endpoint).apply(
+            lambda endpoints: base64.b64encode(app["user_data"](endpoints[0], endpoints[1:])
+                                               .encode("utf-8")).decode("utf-8"))
+
+        ### launch templates, target group and group built from the same arguments as the primary's
+        def template_args(image_id):
+            return app["launch_template_args"](image_id, app_security_group, user_data, settings["keyName"],
+                                               True, pulumi.InvokeOptions(parent=self))
+        launch_templates = {"x86_64": aws.ec2.LaunchTemplate(name + "-launch-template",
+            opts=child,
+            instance_type=app["instance_type"],
+            **template_args(settings["amiId"]))}
+        if "arm64" in app["architectures"]:
+            if not settings["amiIdArm64"]:
+                raise ValueError("regions entry %r needs amiIdArm64 for the arm64 instanceTypes" % region)
+            launch_templates["arm64"] = aws.ec2.LaunchTemplate(name + "-launch-template-arm64",
+                opts=child,
+                **template_args(settings["amiIdArm64"]))
+
+        lb_config = app["lb_config"]
+        target_group = aws.lb.TargetGroup(name + "-tg",
+            opts=child,
+            **app["target_group_args"](self.vpc.id))
+
+        self.auto_scaling_group = aws.autoscaling.Group(name + "-asg",
+            opts=child,
+            name=app["group_name"],
+            tags=[{"key": "Name", "value": "web-app-instance-" + region, "propagate_at_launch": True}],
+            **app["auto_scaling_group_args"](public_subnets, target_group, launch_templates))
+
+        self.load_balancer = aws.lb.LoadBalancer(name + "-alb",
+            opts=child,
+            load_balancer_type="application",
+            security_groups=[load_balancer_sg.id],
+            enable_http2=lb_config["http2"],
+            idle_timeout=lb_config["idleTimeout"],
+            subnets=public_subnets)
+
+        https_listener = aws.lb.Listener(name + "-https-listener",
+            opts=child,
+            load_balancer_arn=self.load_balancer.arn,
+            port=443,
+            protocol="HTTPS",
+            ssl_policy=lb_config["sslPolicy"],
+            certificate_arn=settings["certificateArn"],
+            default_actions=[{"type": "forward", "target_group_arn": target_group.arn}])
+        if lb_config["httpRedirect"]:
+            aws.lb.Listener(name + "-http-redirect-listener",
+                opts=child,
+                load_balancer_arn=self.load_balancer.arn,
+                port=80,
+                protocol="HTTP",
+                default_actions=[{
+                    "type": "redirect",
+                    "redirect": {"port": "443", "protocol": "HTTPS", "status_code": "HTTP_301"},
+                }])
+
+        self.scaling_policies = create_scaling_policies(self.auto_scaling_group, self.load_balancer,
+                                                        target_group, https_listener, app["scaling"],
+                                                        name + "-", child)
+
+        self.register_outputs({
+            "vpcId": self.vpc.id,
+            "loadBalancerDnsName": self.load_balancer.dns_name,
+            "readReplicaEndpoint": self.read_replica.endpoint,
+        })
@@ -0,0 +1,88 @@
+"""Extra regions: a RegionalWebApp each, peered with the primary VPC and behind latency-based DNS."""
+
+import pulumi
+import pulumi_aws as aws
+from regional import RegionalWebApp, latency_record_args
+from stack_config import domainName, extra_regions, hostedZoneId, vpcCidrBlock, vpcName
+from network import private_route_tables, vpc
+from database import (database_security_group, db_parameters, db_proxy_config, dbInstanceClass,
+                      db_writer_endpoint, my_rds)
+from compute import (auto_scaling_group_args, create_user_data, group_name_in, launch_template,
+                     launch_template_args, launch_templates, lb_config, scaling_config,
+                     target_group_args)
+
+# the app connects to the writer, or the RDS Proxy in front of it, from every region
+writer_security_groups = [database_security_group]
+if db_proxy_config["enabled"]:
+    from database import db_proxy_security_group
+    writer_security_groups.append(db_proxy_security_group)
+
+regional_apps = {}
+for region_config in extra_regions:
+    region = region_config["region"]
+    region_provider = aws.Provider(region, region=region)
+    in_region = pulumi.ResourceOptions(provider=region_provider)
+
+    regional_app = RegionalWebApp(region, region_config, {
+        "instance_type": launch_template.instance_type,
+        "architectures": sorted(launch_templates),
+        "group_name": group_name_in(region),
+        "db_instance_class": dbInstanceClass,
+        "db_parameters": db_parameters,
+        "source_db_arn": my_rds.arn,
+        "writer_endpoint": db_writer_endpoint,
+        "lb_config": lb_config,
+        "scaling": scaling_config,
+        # no Redis outside the primary region, and the agent config parameter lives there too
+        "user_data": lambda writer, readers, region=region: create_user_data(writer, readers,
+                                                                             group_region=region),
+        "launch_template_args": launch_template_args,
+        "target_group_args": target_group_args,
+        "auto_scaling_group_args": auto_scaling_group_args,
+    }, opts=in_region)
+    regional_apps[region] = regional_app
+
+    ### VPC peering, so the regional instances reach the primary writer
+    peering = aws.ec2.VpcPeeringConnection(region + "-peering",
+        vpc_id=vpc.id,
+        peer_vpc_id=regional_app.vpc.id,
+        peer_region=region,
+        tags={"Name": vpcName + "-" + region})
+    peering_accepter = aws.ec2.VpcPeeringConnectionAccepter(region + "-peering-accepter",
+        opts=in_region,
+        vpc_peering_connection_id=peering.id,
+        auto_accept=True,
+        tags={"Name": vpcName + "-" + region})
+
+    # the instances sit in the regional public subnets, the writer in the primary private ones
+    aws.ec2.Route(region + "-peering-route",
+        opts=in_region,
+        route_table_id=regional_app.public_route_table.id,
+        destination_cidr_block=vpcCidrBlock,
+        vpc_peering_connection_id=peering_accepter.id)
+    for index, route_table in enumerate(private_route_tables):
+        aws.ec2.Route(region + "-primary-peering-route" + (str(index) if index else ""),
+            route_table_id=route_table.id,
+            destination_cidr_block=region_config["vpcCidrBlock"],
+            vpc_peering_connection_id=peering_accepter.id)
+    for index, security_group in enumerate(writer_security_groups):
+        aws.ec2.SecurityGroupRule("%s-mysqlIngressRule%d" % (region, index),
+            type="ingress",
+            from_port=3306,
+            to_port=3306,
+            protocol="tcp",
+            cidr_blocks=[region_config["vpcCidrBlock"]],
+            security_group_id=security_group.id)
+
+    ### latency record next to the primary region's webServerRecord
+    aws.route53.Record(region + "-webServerRecord",
+        zone_id=hostedZoneId,
+        name=domainName,
+        type="A",
+        aliases=[{
+            "name": regional_app.load_balancer.dns_name,
+            "zone_id": regional_app.load_balancer.zone_id,
+            "evaluate_target_health": True,
+        }],
+        **latency_record_args(region + "-webServerRecord", region, regional_app.load_balancer,
+                              lb_config["healthCheckPath"]))
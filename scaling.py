@@ -0,0 +1,217 @@
+"""Auto scaling for the web app group, driven by the `autoScaling` and `warmPool` stack config.
+
+Target tracking on CPU and on ALB requests per target does the steady-state
+work; a step-scaling policy on a 1-minute CPU alarm adds capacity in bigger
+steps during bursts, and scheduled actions cover known traffic patterns. An
+optional warm pool keeps pre-initialized instances stopped (or hibernated)
+so a scale-out only has to start them. Instances complete the launch hook
+themselves, see `complete_lifecycle_script`.
+"""
+
+import pulumi
+import pulumi_aws as aws
+
+DEFAULTS = {
+    "cpuTarget": 50,
+    # 0 turns the request count policy off
+    "requestsPerTarget": 1000,
+    "instanceWarmup": 60,
+    "disableScaleIn": False,
+    "stepScaling": {
+        "enabled": True,
+        "cpuThreshold": 80,
+        "period": 60,
+        "evaluationPeriods": 1,
+        # bounds are percentage points above cpuThreshold
+        "steps": [
+            {"lower": 0, "upper": 10, "adjustment": 1},
+            {"lower": 10, "adjustment": 2},
+        ],
+    },
+    # e.g. [{"name": "weekday-morning", "recurrence": "0 8 * * 1-5", "minSize": 2}]
+    "scheduledActions": [],
+}
+
+WARM_POOL_DEFAULTS = {
+    "enabled": False,
+    # Stopped, Hibernated (needs an encrypted root volume) or Running
+    "poolState": "Stopped",
+    "minSize": 1,
+    # defaults to the group's max_size when unset
+    "maxPreparedCapacity": None,
+    "reuseOnScaleIn": True,
+    # seconds an instance may spend initializing before the launch hook gives up
+    "hookTimeout": 600,
+}
+
+# instances complete this hook from user data once they are initialized
+LAUNCH_HOOK_NAME = "app-initialized"
+# seconds between instance metadata polls, and polls before giving up on a hook that never appears
+LIFECYCLE_POLL_INTERVAL = 5
+LIFECYCLE_POLL_ATTEMPTS = 12
+
+
+def scaling_settings(overrides):
+    """Merge the `autoScaling` config object over DEFAULTS."""
+    settings = dict(DEFAULTS, **(overrides or {}))
+    settings["stepScaling"] = dict(DEFAULTS["stepScaling"], **(overrides or {}).get("stepScaling", {}))
+    return settings
+
+
+def warm_pool_settings(overrides):
+    """Merge the `warmPool` config object over WARM_POOL_DEFAULTS."""
+    settings = dict(WARM_POOL_DEFAULTS, **(overrides or {}))
+    if settings["poolState"] not in ("Stopped", "Hibernated", "Running"):
+        raise ValueError("warmPool.poolState must be Stopped, Hibernated or Running, got %r"
+                         % settings["poolState"])
+    return settings
+
+
+def warm_pool_args(settings):
+    """`warm_pool` and `initial_lifecycle_hooks` arguments for the group, both None when disabled."""
+    if not settings["enabled"]:
+        return None, None
+    warm_pool = {
+        'pool_state': settings["poolState"],
+        'min_size': settings["minSize"],
+        'max_group_prepared_capacity': settings["maxPreparedCapacity"],
+        'instance_reuse_policy': {'reuse_on_scale_in': settings["reuseOnScaleIn"]},
+    }
+    # holds new instances (warm or in service) until user data has finished
+    hooks = [{
+        'name': LAUNCH_HOOK_NAME,
+        'lifecycle_transition': 'autoscaling:EC2_INSTANCE_LAUNCHING',
+        'default_result': 'CONTINUE',
+        'heartbeat_timeout': settings["hookTimeout"],
+    }]
+    return warm_pool, hooks
+
+
+def complete_lifecycle_script(region, group_name):
+    """User data lines that complete the launch hook every time the group moves the instance.
+
+    The hook fires when an instance enters the warm pool and again when it
+    leaves it. Instances resuming from Hibernated, or leaving a Running pool,
+    do not boot, so a boot script would leave them in Pending:Wait until
+    hookTimeout. Instead a service polls the target lifecycle state in the
+    instance metadata and completes the hook on each change.
+    """
+    return f"""
+sudo tee /usr/local/bin/complete-lifecycle-action.sh > /dev/null <<'EOF'
+#!/bin/bash
+IMDS=http://169.254.169.254/latest
+LAST_STATE=
+ATTEMPTS=0
+while true; do
+  TOKEN=$(curl -s -X PUT $IMDS/api/token -H "X-aws-ec2-metadata-token-ttl-seconds: 60")
+  STATE=$(curl -s -f -H "X-aws-ec2-metadata-token: $TOKEN" $IMDS/meta-data/autoscaling/target-lifecycle-state)
+  if [ -n "$STATE" ] && [ "$STATE" != "$LAST_STATE" ]; then
+    INSTANCE_ID=$(curl -s -H "X-aws-ec2-metadata-token: $TOKEN" $IMDS/meta-data/instance-id)
+    ATTEMPTS=$((ATTEMPTS + 1))
+    # the hook may not be pending yet; after a plain reboot there is none to complete
+    if aws autoscaling complete-lifecycle-action --region {region} --auto-scaling-group-name {group_name} --lifecycle-hook-name {LAUNCH_HOOK_NAME} --lifecycle-action-result CONTINUE --instance-id $INSTANCE_ID || [ $ATTEMPTS -ge {LIFECYCLE_POLL_ATTEMPTS} ]; then
+      LAST_STATE=$STATE
+      ATTEMPTS=0
+    fi
+  fi
+  sleep {LIFECYCLE_POLL_INTERVAL}
+done
+EOF
+sudo chmod +x /usr/local/bin/complete-lifecycle-action.sh
+sudo tee /etc/systemd/system/complete-lifecycle-action.service > /dev/null <<'EOF'
+[Unit]
+Description=Complete the Auto Scaling launch lifecycle hook on every target state change
+After=network-online.target
+
+[Service]
+ExecStart=/usr/local/bin/complete-lifecycle-action.sh
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+sudo systemctl daemon-reload
+sudo systemctl enable --now complete-lifecycle-action.service
+"""
+
+
+def create_scaling_policies(auto_scaling_group, load_balancer, target_group, listener, settings,
+                            prefix="", opts=None):
+    """Create the target tracking, step scaling and scheduled actions; returns the policies by name.
+
+    Resource names start with `prefix`, so every region's group gets its own
+    set, and `opts` (e.g. a regional provider) applies to all of them.
+    """
+    policies = {}
+
+    policies["cpu"] = aws.autoscaling.Policy(prefix + 'CpuTargetTracking',
+        opts=opts,
+        autoscaling_group_name=auto_scaling_group.name,
+        policy_type='TargetTrackingScaling',
+        estimated_instance_warmup=settings["instanceWarmup"],
+        target_tracking_configuration={
+            'predefined_metric_specification': {
+                'predefined_metric_type': 'ASGAverageCPUUtilization',
+            },
+            'target_value': settings["cpuTarget"],
+            'disable_scale_in': settings["disableScaleIn"],
+        })
+
+    if settings["requestsPerTarget"]:
+        # the target group has to be attached to the load balancer before the metric exists
+        policies["requests"] = aws.autoscaling.Policy(prefix + 'RequestCountTargetTracking',
+            opts=pulumi.ResourceOptions.merge(opts, pulumi.ResourceOptions(depends_on=[listener])),
+            autoscaling_group_name=auto_scaling_group.name,
+            policy_type='TargetTrackingScaling',
+            estimated_instance_warmup=settings["instanceWarmup"],
+            target_tracking_configuration={
+                'predefined_metric_specification': {
+                    'predefined_metric_type': 'ALBRequestCountPerTarget',
+                    'resource_label': pulumi.Output.concat(
+                        load_balancer.arn_suffix, "/", target_group.arn_suffix),
+                },
+                'target_value': settings["requestsPerTarget"],
+                'disable_scale_in': settings["disableScaleIn"],
+            })
+
+    step = settings["stepScaling"]
+    if step["enabled"]:
+        policies["burst"] = aws.autoscaling.Policy(prefix + 'BurstStepScaling',
+            opts=opts,
+            autoscaling_group_name=auto_scaling_group.name,
+            policy_type='StepScaling',
+            adjustment_type='ChangeInCapacity',
+            metric_aggregation_type='Average',
+            estimated_instance_warmup=settings["instanceWarmup"],
+            step_adjustments=[{
+                'metric_interval_lower_bound': str(s["lower"]),
+                'metric_interval_upper_bound': str(s["upper"]) if "upper" in s else None,
+                'scaling_adjustment': s["adjustment"],
+            } for s in step["steps"]])
+
+        aws.cloudwatch.MetricAlarm(prefix + 'BurstCpuAlarm',
+            opts=opts,
+            metric_name='CPUUtilization',
+            namespace='AWS/EC2',
+            statistic='Average',
+            comparison_operator='GreaterThanOrEqualToThreshold',
+            threshold=step["cpuThreshold"],
+            period=step["period"],
+            evaluation_periods=step["evaluationPeriods"],
+            alarm_actions=[policies["burst"].arn],
+            dimensions={'AutoScalingGroupName': auto_scaling_group.name})
+
+    for action in settings["scheduledActions"]:
+        aws.autoscaling.Schedule(prefix + 'Schedule-' + action["name"],
+            opts=opts,
+            scheduled_action_name=action["name"],
+            autoscaling_group_name=auto_scaling_group.name,
+            recurrence=action.get("recurrence"),
+            start_time=action.get("startTime"),
+            end_time=action.get("endTime"),
+            time_zone=action.get("timeZone"),
+            min_size=action.get("minSize", -1),
+            max_size=action.get("maxSize", -1),
+            desired_capacity=action.get("desiredCapacity", -1))
+
+    return policies
@@ -0,0 +1,378 @@
+"""Submission pipeline: SNS topic, optional SQS buffer, the Lambda and its DynamoDB table and DAX cache."""
+
+import json
+import pulumi
+import pulumi_aws as aws
+from dynamo import create_table_autoscaling, table_args, table_settings
+from lambda_package import build_dependency_layer, build_handler_archive, package_settings
+from tracing import WRITE_POLICY
+from stack_config import config, extra_regions, features, sizing, topicName, tracing_config, vpcName
+from network import created_privatesubnetsIds, dax_config, vpc
+
+### Create IAM role for Lambda Function
+lambda_role = aws.iam.Role("lambdaRole",
+    assume_role_policy=json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {
+                "Service": "lambda.amazonaws.com"
+            },
+            "Action": "sts:AssumeRole"
+        }
+    ]
+}))
+
+### IAM policy to be attached to the Lambda Role
+# lambda_policy = aws.iam.Policy("lambdaPolicy",
+#     policy=pulumi.Output.all(service_account_key.private_key).apply(lambda key: json.dumps({
+#         "Version": "2012-10-17",
+#         "Statement": [
+#             # Add necessary permissions
+#         ],
+#     })))
+
+#attach policy to lambda role
+lambda_role_attachment = aws.iam.RolePolicyAttachment(
+    "LambdaPolicyAttachment",
+    role=lambda_role.name,
+    policy_arn="arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole",
+)
+
+#attach dynamoDB Access to cloud watch
+dynamoDB_attachment = aws.iam.RolePolicyAttachment(
+    "dynamoDBPolicyAttachment",
+    role=lambda_role.name,
+    policy_arn="arn:aws:iam::aws:policy/AmazonDynamoDBFullAccess",
+    
+)
+
+#let the Lambda runtime send trace segments
+if tracing_config["enabled"]:
+    lambda_xray_attachment = aws.iam.RolePolicyAttachment(
+        "lambdaXrayPolicyAttachment",
+        role=lambda_role.name,
+        policy_arn=WRITE_POLICY,
+    )
+
+### Create Dynamodb
+dynamo_config = table_settings(config.get_object("dynamoDB"), sizing["dynamoDB"])
+dynamo_table = aws.dynamodb.Table("TrackEmail",
+    name=config.require("dynamoDBName"),
+    # a global table with a replica in every extra region
+    **table_args(dynamo_config, [settings["region"] for settings in extra_regions]))
+create_table_autoscaling(dynamo_table, dynamo_config)
+
+### optional DAX cluster in the private subnets; the Lambda joins the VPC to reach it
+dax_endpoint = None
+lambda_vpc_config = None
+if dax_config["enabled"]:
+    lambda_security_group = aws.ec2.SecurityGroup("lambdaSecurityGroup",
+        description="Lambda security group",
+        vpc_id=vpc.id,
+        egress=[
+            # Allow all outbound traffic.
+            {
+                "protocol": "-1",
+                "from_port": 0,
+                "to_port": 0,
+                "cidr_blocks": ["0.0.0.0/0"],
+            }
+        ],
+        tags={"Name": "LambdaSecurityGroup"})
+
+    dax_security_group = aws.ec2.SecurityGroup("daxSecurityGroup",
+        description="DAX security group",
+        vpc_id=vpc.id,
+        ingress=[
+            # encrypted client port
+            {
+                "protocol": "tcp",
+                "from_port": 9111,
+                "to_port": 9111,
+                "security_groups": [lambda_security_group.id],
+            }
+        ],
+        tags={"Name": "DaxSecurityGroup"})
+
+    dax_role = aws.iam.Role("daxRole",
+        assume_role_policy=json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {
+                    "Service": "dax.amazonaws.com"
+                },
+                "Action": "sts:AssumeRole"
+            }
+        ]
+    }))
+
+    dax_role_policy = aws.iam.RolePolicy("daxTablePolicy",
+        role=dax_role.id,
+        policy=dynamo_table.arn.apply(lambda arn: json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Action": "dynamodb:*",
+                "Resource": [arn, arn + "/index/*"],
+            }],
+        })))
+
+    dax_subnet_group = aws.dax.SubnetGroup("daxSubnetGroup",
+        subnet_ids=created_privatesubnetsIds)
+
+    dax_parameter_group = aws.dax.ParameterGroup("daxParameterGroup",
+        parameters=[
+            {"name": "record-ttl-millis", "value": str(dax_config["itemTtl"] * 1000)},
+            {"name": "query-ttl-millis", "value": str(dax_config["queryTtl"] * 1000)},
+        ])
+
+    dax_cluster = aws.dax.Cluster("daxCluster",
+        opts=pulumi.ResourceOptions(depends_on=[dax_role_policy]),
+        cluster_name=(vpcName + "-dax")[:20].lower(),
+        iam_role_arn=dax_role.arn,
+        node_type=dax_config["nodeType"],
+        replication_factor=dax_config["nodes"],
+        subnet_group_name=dax_subnet_group.name,
+        parameter_group_name=dax_parameter_group.name,
+        security_group_ids=[dax_security_group.id],
+        cluster_endpoint_encryption_type="TLS",
+        server_side_encryption={"enabled": True})
+    dax_endpoint = dax_cluster.cluster_address.apply(lambda address: f"daxs://{address}")
+
+    lambda_vpc_attachment = aws.iam.RolePolicyAttachment(
+        "LambdaVPCPolicyAttachment",
+        role=lambda_role.name,
+        policy_arn="arn:aws:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole",
+    )
+
+    lambda_dax_policy = aws.iam.RolePolicy("lambdaDaxPolicy",
+        role=lambda_role.id,
+        policy=dax_cluster.arn.apply(lambda arn: json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Action": "dax:*",
+                "Resource": arn,
+            }],
+        })))
+
+    lambda_vpc_config = {
+        "subnet_ids": created_privatesubnetsIds,
+        "security_group_ids": [lambda_security_group.id],
+    }
+
+# the GCP key only exists with the gcpStorage feature
+service_key = None
+if features["gcpStorage"]:
+    from gcp_storage import service_account_key
+    service_key = service_account_key.private_key
+
+### Lambda sizing and concurrency, overridable with the lambdaFunction config object
+lambda_config = dict({
+    # CPU is allocated in proportion to memory
+    "memorySize": sizing["lambda"]["memorySize"],
+    "timeout": 30,
+    # arm64 needs a deployment package built for it
+    "architecture": "x86_64",
+    "ephemeralStorage": 512,
+    # -1 leaves the function unreserved
+    "reservedConcurrency": -1,
+    "provisionedConcurrency": 0,
+    # e.g. [{"name": "daytime", "schedule": "cron(0 8 * * ? *)", "min": 5, "max": 5}]
+    "provisionedConcurrencySchedules": [],
+    "maxProvisionedConcurrency": 10,
+}, **(config.get_object("lambdaFunction") or {}))
+
+### Lambda artifacts: prebuilt zip, or handler code and a dependency layer built from lambdaPackage.sourceDir
+lambda_runtime = "python3.10"
+lambda_package = package_settings(config.get_object("lambdaPackage"))
+lambda_code = pulumi.AssetArchive({
+    ".": pulumi.FileArchive("./my_deployment_package.zip")
+})
+lambda_code_hash = None
+lambda_layers = None
+if lambda_package["sourceDir"]:
+    handler_archive, lambda_code_hash = build_handler_archive(lambda_package)
+    lambda_code = pulumi.FileArchive(handler_archive)
+    dependency_layer_archive = build_dependency_layer(lambda_package, lambda_runtime,
+                                                      lambda_config["architecture"])
+    if dependency_layer_archive:
+        # a new layer version is published only when the requirements hash changes
+        lambda_dependency_layer = aws.lambda_.LayerVersion("myLambdaDependencies",
+            layer_name="csye6225LambdaDependencies",
+            code=pulumi.FileArchive(dependency_layer_archive[0]),
+            source_code_hash=dependency_layer_archive[1],
+            compatible_runtimes=[lambda_runtime],
+            compatible_architectures=[lambda_config["architecture"]])
+        lambda_layers = [lambda_dependency_layer.arn]
+
+### Create Lambda Function
+# the service account key goes in as an Output input, so the function is
+# registered up front and shows up in previews instead of inside an apply
+lambda_function = aws.lambda_.Function("myLambdaFunction",
+                                runtime=lambda_runtime,
+                                code=lambda_code,
+                                source_code_hash=lambda_code_hash,
+                                layers=lambda_layers,
+                                handler="lambda_function.lambda_handler",
+                                role=lambda_role.arn,
+                                name="csye6225LambdaFunc",
+                                memory_size=lambda_config["memorySize"],
+                                timeout=lambda_config["timeout"],
+                                architectures=[lambda_config["architecture"]],
+                                ephemeral_storage={"size": lambda_config["ephemeralStorage"]},
+                                reserved_concurrent_executions=lambda_config["reservedConcurrency"],
+                                # every change publishes a version for the alias below
+                                publish=True,
+                                vpc_config=lambda_vpc_config,
+                                # segments for the invocation and, through the SDK, its DynamoDB calls
+                                tracing_config={"mode": "Active"} if tracing_config["enabled"] else None,
+                                environment={
+                                    "variables": {
+                                         "DYNAMO_DB_TBALE": config.require("dynamoDBName"),
+                                         "SERVICE_KEY": service_key,
+                                         "MAILGUN_API": config.require("mailgunAPI"),
+                                         "MAILGUN_KEY": config.require_secret("mailgunKey"),
+                                         "BUCKET_NAME": config.require("bucketName"),
+                                         "DAX_ENDPOINT": dax_endpoint,
+                                    }
+                                })
+
+### Invocations go through the "live" alias, which can carry provisioned concurrency
+lambda_alias = aws.lambda_.Alias("myLambdaAlias",
+    name="live",
+    function_name=lambda_function.name,
+    function_version=lambda_function.version)
+
+if lambda_config["provisionedConcurrency"]:
+    lambda_provisioned_concurrency = aws.lambda_.ProvisionedConcurrencyConfig("myLambdaProvisionedConcurrency",
+        # scheduled scaling below owns the number once it is set up
+        opts=pulumi.ResourceOptions(ignore_changes=["provisioned_concurrent_executions"]
+                                    if lambda_config["provisionedConcurrencySchedules"] else None),
+        function_name=lambda_function.name,
+        qualifier=lambda_alias.name,
+        provisioned_concurrent_executions=lambda_config["provisionedConcurrency"])
+
+    if lambda_config["provisionedConcurrencySchedules"]:
+        lambda_scaling_target = aws.appautoscaling.Target("myLambdaScalingTarget",
+            service_namespace="lambda",
+            scalable_dimension="lambda:function:ProvisionedConcurrency",
+            resource_id=pulumi.Output.concat("function:", lambda_function.name, ":", lambda_alias.name),
+            min_capacity=lambda_config["provisionedConcurrency"],
+            max_capacity=lambda_config["maxProvisionedConcurrency"],
+            opts=pulumi.ResourceOptions(depends_on=[lambda_provisioned_concurrency]))
+
+        for lambda_schedule in lambda_config["provisionedConcurrencySchedules"]:
+            aws.appautoscaling.ScheduledAction("myLambdaSchedule-" + lambda_schedule["name"],
+                name=lambda_schedule["name"],
+                service_namespace=lambda_scaling_target.service_namespace,
+                scalable_dimension=lambda_scaling_target.scalable_dimension,
+                resource_id=lambda_scaling_target.resource_id,
+                schedule=lambda_schedule["schedule"],
+                timezone=lambda_schedule.get("timeZone"),
+                scalable_target_action={
+                    "min_capacity": lambda_schedule["min"],
+                    "max_capacity": lambda_schedule["max"],
+                })
+
+
+### Create SNS topic for post submission
+submission_snstopic =aws.sns.Topic("csye6225Topic", name=topicName,
+    # passes the trace header from the app on to the subscribers
+    tracing_config="Active" if tracing_config["enabled"] else None)
+
+### optionally buffer submissions in SQS and hand them to the Lambda in batches
+submission_queue_config = dict({
+    "enabled": False,
+    "batchSize": 10,
+    "batchingWindow": 5,
+    # at least 2
+    "maxConcurrency": 5,
+    # seconds; defaults to 6x the function timeout, as AWS recommends for Lambda sources
+    "visibilityTimeout": None,
+    # receives before a message goes to the dead-letter queue
+    "maxReceiveCount": 5,
+}, **(config.get_object("submissionQueue") or {}))
+if submission_queue_config["visibilityTimeout"] is None:
+    submission_queue_config["visibilityTimeout"] = 6 * lambda_config["timeout"]
+# messages would become visible again while the function still works on them
+if submission_queue_config["visibilityTimeout"] < lambda_config["timeout"]:
+    raise ValueError("submissionQueue.visibilityTimeout %ds is below the function timeout of %ds"
+                     % (submission_queue_config["visibilityTimeout"], lambda_config["timeout"]))
+if submission_queue_config["maxConcurrency"] < 2:
+    raise ValueError("submissionQueue.maxConcurrency must be at least 2, got %r"
+                     % submission_queue_config["maxConcurrency"])
+# my_deployment_package.zip reads SNS events (Records[].Sns.Message), so every
+# SQS batch would fail and end up in the dead-letter queue
+if submission_queue_config["enabled"] and not lambda_package["sourceDir"]:
+    raise ValueError("submissionQueue needs lambdaPackage.sourceDir with a handler for SQS records;"
+                     " the prebuilt zip only handles SNS events")
+
+if not submission_queue_config["enabled"]:
+    ### Subscribe the Lambda function to the SNS topic
+    with_sns = aws.lambda_.Permission("withSns",
+        action="lambda:InvokeFunction",
+        function=lambda_function.name,
+        qualifier=lambda_alias.name,
+        principal="sns.amazonaws.com",
+        source_arn=submission_snstopic.arn)
+
+    subscription = aws.sns.TopicSubscription('mySubscription',
+        topic=submission_snstopic.arn,
+        protocol='lambda',
+        endpoint=lambda_alias.arn
+    )
+else:
+    submission_dlq = aws.sqs.Queue("submissionDeadLetterQueue",
+        message_retention_seconds=1209600)
+
+    submission_queue = aws.sqs.Queue("submissionQueue",
+        visibility_timeout_seconds=submission_queue_config["visibilityTimeout"],
+        redrive_policy=submission_dlq.arn.apply(lambda arn: json.dumps({
+            "deadLetterTargetArn": arn,
+            "maxReceiveCount": submission_queue_config["maxReceiveCount"],
+        })))
+
+    # let the topic deliver into the queue
+    submission_queue_policy = aws.sqs.QueuePolicy("submissionQueuePolicy",
+        queue_url=submission_queue.id,
+        policy=pulumi.Output.all(submission_queue.arn, submission_snstopic.arn).apply(
+            lambda arns: json.dumps({
+                "Version": "2012-10-17",
+                "Statement": [{
+                    "Effect": "Allow",
+                    "Principal": {"Service": "sns.amazonaws.com"},
+                    "Action": "sqs:SendMessage",
+                    "Resource": arns[0],
+                    "Condition": {"ArnEquals": {"aws:SourceArn": arns[1]}},
+                }],
+            })))
+
+    # unlike the direct subscription's Records[].Sns.Message, each record's body
+    # is the SNS envelope as a JSON string, with the message under "Message"
+    subscription = aws.sns.TopicSubscription('submissionQueueSubscription',
+        topic=submission_snstopic.arn,
+        protocol='sqs',
+        endpoint=submission_queue.arn)
+
+    lambda_sqs_attachment = aws.iam.RolePolicyAttachment(
+        "LambdaSQSPolicyAttachment",
+        role=lambda_role.name,
+        policy_arn="arn:aws:iam::aws:policy/service-role/AWSLambdaSQSQueueExecutionRole",
+    )
+
+    submission_event_source = aws.lambda_.EventSourceMapping("submissionEventSource",
+        opts=pulumi.ResourceOptions(depends_on=[lambda_sqs_attachment]),
+        event_source_arn=submission_queue.arn,
+        function_name=lambda_alias.arn,
+        batch_size=submission_queue_config["batchSize"],
+        maximum_batching_window_in_seconds=submission_queue_config["batchingWindow"],
+        # only failed records go back to the queue
+        function_response_types=["ReportBatchItemFailures"],
+        scaling_config={
+            "maximum_concurrency": submission_queue_config["maxConcurrency"],
+        })
@@ -0,0 +1,139 @@
+"""Named sizing profiles that set capacity for every tier from one stack setting.
+
+Profiles live in sizing_profiles.yaml. A stack picks one with `sizingProfile`
+(default `dev`) and can change single keys with the `sizing` config object,
+e.g. {"db": {"multiAz": true}}. `resolve_profile` merges the two and
+validates the result, so an instance class without tuning data or an IOPS
+value the storage type does not take fails before anything is created.
+The more specific keys (`instanceType`, `dbInstanceClass`, `lambdaFunction`,
+`dynamoDB`) still win over the profile; stack_config.py merges `instanceType`
+and `dbInstanceClass` into the overrides, so they are validated with it.
+"""
+
+import os
+
+import yaml
+
+from db_tuning import INSTANCE_CLASSES
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sizing_profiles.yaml")
+DEFAULT_PROFILE = "dev"
+
+STORAGE_TYPES = ("gp2", "gp3", "io1", "io2", "standard")
+VOLUME_TYPES = ("gp2", "gp3", "io1", "io2")
+BILLING_MODES = ("PAY_PER_REQUEST", "PROVISIONED")
+
+# MariaDB on gp3: below this size the 3000 IOPS / 125 MiB/s baseline is fixed
+GP3_PROVISIONED_IOPS_MIN_STORAGE = 400
+# MariaDB Performance Insights is not offered on these sizes
+NO_PERFORMANCE_INSIGHTS = (".micro", ".small")
+
+
+def load_profiles(path=PROFILES_FILE):
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def _merge(base, overrides, path=""):
+    merged = dict(base)
+    for key, value in (overrides or {}).items():
+        if key not in base:
+            raise ValueError("unknown sizing key %s%s" % (path, key))
+        if isinstance(base[key], dict) and isinstance(value, dict):
+            value = _merge(base[key], value, path + key + ".")
+        merged[key] = value
+    return merged
+
+
+def _validate_root_volume(volume):
+    if volume["volumeType"] not in VOLUME_TYPES:
+        raise ValueError("rootVolume.volumeType must be one of %s, got %r"
+                         % (", ".join(VOLUME_TYPES), volume["volumeType"]))
+    if volume["size"] is not None and not 1 <= volume["size"] <= 16384:
+        raise ValueError("rootVolume.size must be 1 to 16384 GiB, got %r" % volume["size"])
+    iops, throughput = volume["iops"], volume["throughput"]
+    if volume["volumeType"] == "gp3":
+        if iops and not 3000 <= iops <= 16000:
+            raise ValueError("rootVolume.iops on gp3 must be 3000 to 16000, got %r" % iops)
+        if throughput and not 125 <= throughput <= 1000:
+            raise ValueError("rootVolume.throughput on gp3 must be 125 to 1000 MiB/s, got %r" % throughput)
+        if iops and throughput and throughput > iops / 4:
+            raise ValueError("rootVolume.throughput on gp3 can be at most iops / 4 MiB/s")
+    elif volume["volumeType"] in ("io1", "io2"):
+        if not iops:
+            raise ValueError("rootVolume.volumeType %s needs rootVolume.iops" % volume["volumeType"])
+    elif iops:
+        raise ValueError("rootVolume.volumeType gp2 does not take rootVolume.iops")
+    if throughput and volume["volumeType"] != "gp3":
+        raise ValueError("rootVolume.throughput only applies to gp3")
+
+
+def _validate_db(db):
+    if db["instanceClass"] not in INSTANCE_CLASSES:
+        raise ValueError("no tuning data for %s, add it to db_tuning.INSTANCE_CLASSES" % db["instanceClass"])
+    if db["storageType"] not in STORAGE_TYPES:
+        raise ValueError("db.storageType must be one of %s, got %r"
+                         % (", ".join(STORAGE_TYPES), db["storageType"]))
+    if not 20 <= db["allocatedStorage"] <= 65536:
+        raise ValueError("db.allocatedStorage must be 20 to 65536 GiB, got %r" % db["allocatedStorage"])
+    iops, throughput = db["iops"], db["storageThroughput"]
+    if db["storageType"] in ("io1", "io2"):
+        if not iops or not 1000 <= iops <= 256000:
+            raise ValueError("db.storageType %s needs db.iops between 1000 and 256000" % db["storageType"])
+        if not 0.5 <= iops / db["allocatedStorage"] <= 50:
+            raise ValueError("db.iops must be 0.5 to 50 times db.allocatedStorage for %s" % db["storageType"])
+    elif db["storageType"] == "gp3":
+        if (iops or throughput) and db["allocatedStorage"] < GP3_PROVISIONED_IOPS_MIN_STORAGE:
+            raise ValueError("gp3 below %d GiB has a fixed baseline, drop db.iops and db.storageThroughput"
+                             % GP3_PROVISIONED_IOPS_MIN_STORAGE)
+        if bool(iops) != bool(throughput):
+            raise ValueError("set db.iops and db.storageThroughput together on gp3")
+        if iops and not 12000 <= iops <= 64000:
+            raise ValueError("db.iops on gp3 must be 12000 to 64000, got %r" % iops)
+        if throughput and not 500 <= throughput <= 4000:
+            raise ValueError("db.storageThroughput on gp3 must be 500 to 4000 MiB/s, got %r" % throughput)
+    elif iops:
+        raise ValueError("db.storageType %s does not take db.iops" % db["storageType"])
+    if throughput and db["storageType"] != "gp3":
+        raise ValueError("db.storageThroughput only applies to gp3")
+    # in integers: 50 * 1.1 is a hair above 55
+    if db["maxAllocatedStorage"] is not None and db["maxAllocatedStorage"] * 10 < db["allocatedStorage"] * 11:
+        raise ValueError("db.maxAllocatedStorage must be at least 10%% above db.allocatedStorage, got %r"
+                         % db["maxAllocatedStorage"])
+    if db["performanceInsights"] and db["instanceClass"].endswith(NO_PERFORMANCE_INSIGHTS):
+        raise ValueError("db.performanceInsights is not available on %s" % db["instanceClass"])
+
+
+def validate(sizing):
+    """Raise ValueError on the first inconsistent value; returns `sizing`."""
+    if sizing["ebsOptimized"] and sizing["instanceType"].startswith("t2."):
+        raise ValueError("%s can not be EBS-optimized, set ebsOptimized to false" % sizing["instanceType"])
+    _validate_root_volume(sizing["rootVolume"])
+
+    asg = sizing["asg"]
+    if not 0 <= asg["minSize"] <= asg["desiredCapacity"] <= asg["maxSize"]:
+        raise ValueError("asg sizes must satisfy 0 <= minSize <= desiredCapacity <= maxSize, got %d/%d/%d"
+                         % (asg["minSize"], asg["desiredCapacity"], asg["maxSize"]))
+
+    _validate_db(sizing["db"])
+
+    memory = sizing["lambda"]["memorySize"]
+    if not 128 <= memory <= 10240:
+        raise ValueError("lambda.memorySize must be 128 to 10240 MB, got %r" % memory)
+
+    if sizing["dynamoDB"]["billingMode"] not in BILLING_MODES:
+        raise ValueError("dynamoDB.billingMode must be one of %s, got %r"
+                         % (", ".join(BILLING_MODES), sizing["dynamoDB"]["billingMode"]))
+    return sizing
+
+
+def resolve_profile(name=None, overrides=None, profiles=None):
+    """The validated sizing of profile `name` with `overrides` merged in."""
+    profiles = profiles if profiles is not None else load_profiles()
+    name = name or DEFAULT_PROFILE
+    if name not in profiles:
+        raise ValueError("unknown sizing profile %r, expected one of %s" % (name, ", ".join(profiles)))
+    try:
+        return validate(_merge(profiles[name], overrides))
+    except ValueError as error:
+        raise ValueError("sizing profile %s: %s" % (name, error)) from None
@@ -0,0 +1,61 @@
+"""Stack config shared by the program modules, and the `features` that turn optional ones on."""
+
+import pulumi
+
+from regional import region_settings
+from sizing import resolve_profile
+from tracing import tracing_settings
+
+aws_config = pulumi.Config("aws")
+aws_region = aws_config.require("region")
+
+config = pulumi.Config()
+vpcCidrBlock = config.require("vpcCidrBlock")
+vpcName = config.require("vpcName")
+internetGatewayName = config.require("internetGatewayName")
+publicRouteTableName = config.require("publicRouteTableName")
+privateRouteTableName = config.require("privateRouteTableName")
+publicSubnetsName = config.require("publicSubnetsName")
+privateSubnetsName = config.require("privateSubnetsName")
+publicSubnetAssoName = config.require("publicSubnetAssoName")
+privateSubnetAssoName = config.require("privateSubnetAssoName")
+destinationCidrBlock = config.require("destinationCidrBlock")
+amiId = config.require("amiId")
+sshkeyName = config.require("sshkeyName")
+instanceName = config.require("instanceName")
+appSecurityGroup = config.require("appSecurityGroup")
+rdsPassword = config.require("rdsPassword")
+rdsUsername = config.require("rdsUsername")
+rsdIdentifier = config.require("rsdIdentifier")
+databaseName = config.require("databaseName")
+
+
+domainName = config.require("domainName")
+hostedZoneId = config.require("hostedZoneId")
+cloudWatchRoleName= config.require("cloudWatchRoleName")
+
+topicName= config.require("topicName")
+awsAccountNumber = config.require("awsAccountNumber")
+
+### capacity of every tier, from the named profile in sizing_profiles.yaml, see sizing.py
+sizing_overrides = dict(config.get_object("sizing") or {})
+# instanceType and dbInstanceClass win over the profile, and are validated with it
+if config.get("instanceType"):
+    sizing_overrides["instanceType"] = config.get("instanceType")
+if config.get("dbInstanceClass"):
+    sizing_overrides["db"] = dict(sizing_overrides.get("db") or {}, instanceClass=config.get("dbInstanceClass"))
+sizing = resolve_profile(config.get("sizingProfile"), sizing_overrides)
+
+### X-Ray tracing from the ALB through SNS to the Lambda, see tracing.py
+tracing_config = tracing_settings(config.get_object("tracing"))
+
+### extra regions served next to aws:region, each with its own VPC, ALB and read replica, see regional.py
+extra_regions = region_settings(config.get_object("regions"), aws_region, vpcCidrBlock)
+
+### optional parts of the program; each lives in its own module, imported only when enabled
+features = dict({
+    # Lambda, DynamoDB and the SNS submission pipeline, see serverless.py
+    "serverless": True,
+    # GCP service account and key the Lambda uploads submissions with, see gcp_storage.py
+    "gcpStorage": True,
+}, **(config.get_object("features") or {}))
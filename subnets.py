@@ -0,0 +1,79 @@
+"""Lazy subnet CIDR allocation for the VPC tiers.
+
+Subnets are carved one at a time from the VPC CIDR instead of listing every
+possible /24, so a /8 costs the same as a /16. Tiers are allocated in the
+order they are requested, each subnet aligned to its own size, which keeps
+the layout of existing stacks (public /24s first, then private /24s).
+"""
+
+from ipaddress import ip_network
+
+TIERS = ("public", "private", "data", "cache")
+DEFAULT_PREFIX = 24
+
+
+def default_prefix(network, count=None):
+    """/24 when `count` /24 subnets fit in `network`, else the largest prefix that fits them.
+
+    Without a count, a VPC that holds no /24 at all gets room for 8 subnets.
+    """
+    if count is None:
+        count = 1 if network.prefixlen <= DEFAULT_PREFIX else 8
+    if network.prefixlen <= DEFAULT_PREFIX and count <= 1 << (DEFAULT_PREFIX - network.prefixlen):
+        return DEFAULT_PREFIX
+    return min(network.prefixlen + (count - 1).bit_length(), network.max_prefixlen)
+
+
+class SubnetAllocator:
+    """Hands out non-overlapping subnets of a VPC CIDR per tier, in request order.
+
+    `subnet_count` is how many subnets the whole layout takes; tiers without a
+    prefix length in `prefix_lengths` only get smaller than /24 when that many
+    /24s do not fit.
+    """
+
+    def __init__(self, cidr_block, prefix_lengths=None, subnet_count=None):
+        self.network = ip_network(cidr_block)
+        prefix = default_prefix(self.network, subnet_count)
+        self.prefix_lengths = {tier: prefix for tier in TIERS}
+        for tier, prefix in (prefix_lengths or {}).items():
+            if tier not in TIERS:
+                raise ValueError("unknown subnet tier %r, expected one of %s" % (tier, ", ".join(TIERS)))
+            prefix = int(prefix)
+            if not self.network.prefixlen <= prefix <= self.network.max_prefixlen:
+                raise ValueError("prefix /%d for %s subnets does not fit in %s"
+                                 % (prefix, tier, self.network))
+            self.prefix_lengths[tier] = prefix
+        # offset of the next free address from the start of the VPC CIDR
+        self._cursor = 0
+        self.allocated = {tier: [] for tier in TIERS}
+
+    def _next(self, prefix):
+        size = 1 << (self.network.max_prefixlen - prefix)
+        start = -(-self._cursor // size) * size
+        if start + size > self.network.num_addresses:
+            raise ValueError("%s has no room left for another /%d subnet" % (self.network, prefix))
+        self._cursor = start + size
+        return ip_network((int(self.network.network_address) + start, prefix))
+
+    def allocate(self, tier, count):
+        """Allocate `count` more subnets for `tier` and return them."""
+        if tier not in TIERS:
+            raise ValueError("unknown subnet tier %r, expected one of %s" % (tier, ", ".join(TIERS)))
+        subnets = [self._next(self.prefix_lengths[tier]) for _ in range(count)]
+        self.allocated[tier].extend(subnets)
+        return subnets
+
+
+def find_overlaps(networks):
+    """Return every (a, b) pair of overlapping networks, e.g. to check pinned CIDRs."""
+    overlaps = []
+    open_networks = []
+    for network in sorted((ip_network(n) for n in networks),
+                          key=lambda n: (n.version, n.network_address, n.prefixlen)):
+        open_networks = [n for n in open_networks
+                         if n.version == network.version
+                         and n.broadcast_address >= network.network_address]
+        overlaps.extend((n, network) for n in open_networks)
+        open_networks.append(network)
+    return overlaps
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the program's modules live in the project root, next to __main__.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,115 @@
+import pytest
+
+from db_tuning import (GIB, INSTANCE_CLASSES, MIB, PROFILES, STATIC_PARAMETERS, mariadb_parameters, max_connections,
+                       tuned_values, usable_memory)
+
+# modifiable parameters of the mariadb10.6 family that tuning may emit or be overridden with
+MARIADB_10_6_PARAMETERS = {
+    "innodb_buffer_pool_size",
+    "innodb_flush_log_at_trx_commit",
+    "innodb_log_file_size",
+    "max_connections",
+    "query_cache_size",
+    "query_cache_type",
+    "sync_binlog",
+    "thread_cache_size",
+}
+
+CASES = [(instance_class, profile) for instance_class in sorted(INSTANCE_CLASSES) for profile in PROFILES]
+
+
+@pytest.mark.parametrize("instance_class,profile", CASES)
+def test_buffer_pool_fits_memory_in_whole_chunks(instance_class, profile):
+    memory_gib, _ = INSTANCE_CLASSES[instance_class]
+    buffer_pool = tuned_values(instance_class, profile)["innodb_buffer_pool_size"]
+    share = 0.5 if memory_gib < 4 else 0.75
+    assert buffer_pool % (128 * MIB) == 0
+    assert 128 * MIB <= buffer_pool <= usable_memory(instance_class) * share
+
+
+@pytest.mark.parametrize("instance_class,profile", CASES)
+def test_max_connections_come_from_memory_left_over(instance_class, profile):
+    values = tuned_values(instance_class, profile)
+    left_over = usable_memory(instance_class) - values["innodb_buffer_pool_size"] - values["query_cache_size"]
+    assert values["max_connections"] == min(left_over // (12 * MIB), 16000)
+    assert values["max_connections"] >= 50
+
+
+@pytest.mark.parametrize("instance_class,profile", CASES)
+def test_memory_is_not_overcommitted(instance_class, profile):
+    memory_gib, _ = INSTANCE_CLASSES[instance_class]
+    values = tuned_values(instance_class, profile)
+    used = (values["innodb_buffer_pool_size"] + values["query_cache_size"]
+            + values["max_connections"] * 12 * MIB)
+    # the OS and RDS keep at least 256 MiB or a tenth of the class memory
+    assert used <= memory_gib * GIB - max(256 * MIB, memory_gib * GIB // 10)
+
+
+@pytest.mark.parametrize("instance_class,profile", CASES)
+def test_redo_log_bounds(instance_class, profile):
+    values = tuned_values(instance_class, profile)
+    durable = tuned_values(instance_class, "durability")["innodb_log_file_size"]
+    if profile == "durability":
+        assert 128 * MIB <= values["innodb_log_file_size"] <= 2 * GIB
+        assert values["innodb_flush_log_at_trx_commit"] == 1 and values["sync_binlog"] == 1
+    else:
+        assert 256 * MIB <= values["innodb_log_file_size"] <= 4 * GIB
+        assert values["innodb_log_file_size"] >= durable
+        assert values["innodb_flush_log_at_trx_commit"] == 2 and values["sync_binlog"] == 0
+
+
+@pytest.mark.parametrize("instance_class,profile,buffer_pool,max_connections,redo_log", [
+    # the buffer pool gives way so 50 connections fit in the 768 MiB left over
+    ("db.t3.micro", "durability", 128 * MIB, 52, 128 * MIB),
+    ("db.t3.micro", "throughput", 128 * MIB, 52, 256 * MIB),
+    ("db.t3.small", "durability", 896 * MIB, 73, 224 * MIB),
+    ("db.m5.large", "durability", 5504 * MIB, 155, 1376 * MIB),
+    ("db.r6g.large", "durability", 11008 * MIB, 311, 2 * GIB),
+    ("db.r6g.large", "throughput", 11008 * MIB, 311, 4 * GIB),
+])
+def test_known_values(instance_class, profile, buffer_pool, max_connections, redo_log):
+    values = tuned_values(instance_class, profile)
+    assert values["innodb_buffer_pool_size"] == buffer_pool
+    assert values["max_connections"] == max_connections
+    assert values["innodb_log_file_size"] == redo_log
+
+
+@pytest.mark.parametrize("instance_class,profile", CASES)
+def test_every_parameter_exists_in_mariadb_10_6(instance_class, profile):
+    names = {parameter["name"] for parameter in mariadb_parameters(instance_class, profile)}
+    assert names - MARIADB_10_6_PARAMETERS == set()
+    assert STATIC_PARAMETERS <= MARIADB_10_6_PARAMETERS
+
+
+def test_static_parameters_wait_for_reboot():
+    methods = {p["name"]: p["apply_method"] for p in mariadb_parameters("db.t3.micro")}
+    assert methods["innodb_buffer_pool_size"] == "pending-reboot"
+    assert methods["max_connections"] == "immediate"
+
+
+def test_overrides_win():
+    values = {p["name"]: p["value"] for p in mariadb_parameters("db.t3.micro", overrides={"max_connections": 200})}
+    assert values["max_connections"] == "200"
+
+
+@pytest.mark.parametrize("override,expected", [
+    (None, 155),
+    (200, 200),
+    ("300", 300),
+    # RDS formulas are evaluated by RDS, the alarm falls back to the tuned value
+    ("{DBInstanceClassMemory/12582880}", 155),
+    ("GREATEST({DBInstanceClassMemory/9531392},5000)", 155),
+])
+def test_max_connections_for_alarms(override, expected):
+    overrides = {"max_connections": override} if override is not None else {}
+    assert max_connections("db.m5.large", "durability", overrides) == expected
+    if override is not None:
+        values = {p["name"]: p["value"] for p in mariadb_parameters("db.m5.large", overrides=overrides)}
+        assert values["max_connections"] == str(override)
+
+
+def test_unknown_class_and_profile():
+    with pytest.raises(ValueError):
+        tuned_values("db.x9.huge")
+    with pytest.raises(ValueError):
+        tuned_values("db.t3.micro", "fast")
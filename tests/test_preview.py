@@ -0,0 +1,17 @@
+import pytest
+
+from bench.harness import execute
+
+
+def resource_names(stack, preview):
+    return {"%s::%s" % resource for resource in execute(stack, preview).mocks.resources}
+
+
+@pytest.mark.parametrize("stack", ["dev", "demo"])
+def test_preview_plans_every_resource(stack):
+    # resources registered inside apply callbacks would only show up on `up`
+    preview = resource_names(stack, True)
+    assert preview == resource_names(stack, False)
+    # the Lambda path used to be registered inside the GCP key's apply
+    assert {"aws:lambda/function:Function::myLambdaFunction", "aws:lambda/permission:Permission::withSns",
+            "aws:sns/topicSubscription:TopicSubscription::mySubscription"} <= preview
@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+from bench.harness import execute
+from bench.regions import SAMPLE_REGIONS, check, regional_resources
+
+REGIONS = [settings["region"] for settings in SAMPLE_REGIONS]
+
+
+@pytest.fixture(scope="module")
+def multi_region():
+    return execute("dev", False, {"regions": json.dumps(SAMPLE_REGIONS)}).mocks
+
+
+def test_regions_check(multi_region):
+    assert check(multi_region, REGIONS) == []
+
+
+def test_every_region_gets_resources(multi_region):
+    assert all(regional_resources(multi_region, region) for region in REGIONS)
+
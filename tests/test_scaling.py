@@ -0,0 +1,51 @@
+import re
+import subprocess
+
+import pytest
+
+from scaling import (LAUNCH_HOOK_NAME, complete_lifecycle_script, scaling_settings, warm_pool_args,
+                     warm_pool_settings)
+
+
+def embedded_scripts(user_data):
+    """Bodies of the heredocs the user data writes out."""
+    return re.findall(r"<<'EOF'\n(.*?)\nEOF\n", user_data, re.S)
+
+
+@pytest.mark.parametrize("pool_state", ["Stopped", "Hibernated", "Running"])
+def test_hook_is_completed_without_a_boot(pool_state):
+    # resuming from hibernation or leaving a running pool does not boot the
+    # instance, so a cloud-init per-boot script would never complete the hook
+    warm_pool, hooks = warm_pool_args(warm_pool_settings({"enabled": True, "poolState": pool_state}))
+    assert warm_pool["pool_state"] == pool_state
+    assert hooks[0]["name"] == LAUNCH_HOOK_NAME
+    assert hooks[0]["lifecycle_transition"] == "autoscaling:EC2_INSTANCE_LAUNCHING"
+
+    script = complete_lifecycle_script("eu-west-1", "webapp-eu-west-1")
+    assert "per-boot" not in script
+    assert "meta-data/autoscaling/target-lifecycle-state" in script
+    assert "systemctl enable --now complete-lifecycle-action.service" in script
+    assert ("--region eu-west-1 --auto-scaling-group-name webapp-eu-west-1 --lifecycle-hook-name %s"
+            % LAUNCH_HOOK_NAME) in script
+
+
+def test_lifecycle_script_is_valid_bash():
+    script = complete_lifecycle_script("us-east-1", "webapp")
+    for body in [script] + embedded_scripts(script)[:1]:
+        subprocess.run(["bash", "-n"], input=body, text=True, check=True)
+
+
+def test_warm_pool_disabled():
+    assert warm_pool_args(warm_pool_settings(None)) == (None, None)
+
+
+def test_unknown_pool_state():
+    with pytest.raises(ValueError, match="warmPool.poolState"):
+        warm_pool_settings({"poolState": "Terminated"})
+
+
+def test_step_scaling_overrides_merge():
+    settings = scaling_settings({"cpuTarget": 40, "stepScaling": {"cpuThreshold": 90}})
+    assert settings["cpuTarget"] == 40
+    assert settings["stepScaling"]["cpuThreshold"] == 90
+    assert settings["stepScaling"]["enabled"] is True
@@ -0,0 +1,11 @@
+import json
+
+import pytest
+
+from bench.harness import execute
+
+
+def test_submission_queue_needs_an_sqs_handler():
+    # the prebuilt zip reads Records[].Sns.Message, which SQS records do not have
+    with pytest.raises(ValueError, match="submissionQueue needs lambdaPackage.sourceDir"):
+        execute("dev", True, {"submissionQueue": json.dumps({"enabled": True})})
@@ -0,0 +1,133 @@
+import pytest
+
+from sizing import GP3_PROVISIONED_IOPS_MIN_STORAGE, load_profiles, resolve_profile
+
+PROVISIONED_IO1 = {"storageType": "io1", "allocatedStorage": 100, "iops": 3000, "storageThroughput": None,
+                   "maxAllocatedStorage": None}
+
+
+@pytest.mark.parametrize("name", sorted(load_profiles()))
+def test_every_profile_validates(name):
+    sizing = resolve_profile(name)
+    assert sizing["asg"]["minSize"] <= sizing["asg"]["desiredCapacity"] <= sizing["asg"]["maxSize"]
+
+
+def test_default_profile_is_dev():
+    assert resolve_profile() == resolve_profile("dev")
+
+
+def test_overrides_merge_into_nested_keys():
+    sizing = resolve_profile("staging", {"db": {"multiAz": True}, "asg": {"maxSize": 8}})
+    assert sizing["db"]["multiAz"] is True
+    assert sizing["db"]["instanceClass"] == "db.t3.small"
+    assert sizing["asg"] == {"minSize": 2, "maxSize": 8, "desiredCapacity": 2}
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match="unknown sizing profile 'huge'"):
+        resolve_profile("huge")
+
+
+@pytest.mark.parametrize("overrides,message", [
+    # unknown keys, at the top and nested
+    ({"instanceTypes": ["t3.small"]}, "unknown sizing key instanceTypes"),
+    ({"db": {"engine": "mysql"}}, "unknown sizing key db.engine"),
+    ({"rootVolume": {"kmsKeyId": "alias/ebs"}}, "unknown sizing key rootVolume.kmsKeyId"),
+    # the root device name comes from the AMI
+    ({"rootVolume": {"deviceName": "/dev/sda1"}}, "unknown sizing key rootVolume.deviceName"),
+    # instance
+    ({"instanceType": "t2.micro"}, "t2.micro can not be EBS-optimized"),
+    # asg ordering
+    ({"asg": {"minSize": 3, "desiredCapacity": 2}}, "minSize <= desiredCapacity <= maxSize"),
+    ({"asg": {"desiredCapacity": 5}}, "minSize <= desiredCapacity <= maxSize"),
+    ({"asg": {"minSize": -1, "desiredCapacity": 0}}, "0 <= minSize"),
+    # lambda and DynamoDB
+    ({"lambda": {"memorySize": 64}}, "lambda.memorySize"),
+    ({"lambda": {"memorySize": 20480}}, "lambda.memorySize"),
+    ({"dynamoDB": {"billingMode": "ON_DEMAND"}}, "dynamoDB.billingMode"),
+])
+def test_bad_overrides(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_profile("staging", overrides)
+
+
+@pytest.mark.parametrize("root_volume,message", [
+    ({"volumeType": "st1"}, "rootVolume.volumeType must be one of"),
+    ({"size": 0}, "rootVolume.size"),
+    ({"size": 20000}, "rootVolume.size"),
+    ({"iops": 2000}, "rootVolume.iops on gp3"),
+    ({"iops": 20000}, "rootVolume.iops on gp3"),
+    ({"throughput": 100}, "rootVolume.throughput on gp3"),
+    ({"iops": 3000, "throughput": 1000}, "at most iops / 4"),
+    ({"volumeType": "io1", "iops": None, "throughput": None}, "needs rootVolume.iops"),
+    ({"volumeType": "gp2", "throughput": None}, "gp2 does not take rootVolume.iops"),
+    ({"volumeType": "io2", "iops": 3000, "throughput": 125}, "throughput only applies to gp3"),
+])
+def test_bad_root_volume(root_volume, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_profile("staging", {"rootVolume": root_volume})
+
+
+def test_root_volume_without_provisioned_performance():
+    volume = resolve_profile("staging", {"rootVolume": {"volumeType": "gp2", "iops": None,
+                                                        "throughput": None}})["rootVolume"]
+    assert volume["volumeType"] == "gp2"
+
+
+@pytest.mark.parametrize("db,message", [
+    ({"instanceClass": "db.x2g.large"}, "no tuning data for db.x2g.large"),
+    ({"storageType": "magnetic"}, "db.storageType must be one of"),
+    ({"allocatedStorage": 10}, "db.allocatedStorage"),
+    ({"allocatedStorage": 70000, "maxAllocatedStorage": None}, "db.allocatedStorage"),
+    # gp3 provisioned performance only above the baseline size
+    ({"allocatedStorage": GP3_PROVISIONED_IOPS_MIN_STORAGE - 1, "maxAllocatedStorage": None,
+      "iops": 12000, "storageThroughput": 500}, "gp3 below 400 GiB has a fixed baseline"),
+    ({"allocatedStorage": 100, "iops": 12000}, "gp3 below 400 GiB"),
+    ({"allocatedStorage": 400, "maxAllocatedStorage": None, "iops": 12000},
+     "set db.iops and db.storageThroughput together"),
+    ({"allocatedStorage": 400, "maxAllocatedStorage": None, "iops": 6000, "storageThroughput": 500},
+     "db.iops on gp3 must be 12000 to 64000"),
+    ({"allocatedStorage": 400, "maxAllocatedStorage": None, "iops": 12000, "storageThroughput": 125},
+     "db.storageThroughput on gp3 must be 500 to 4000"),
+    # io1 needs IOPS within 0.5 to 50 per GiB
+    (dict(PROVISIONED_IO1, iops=None), "needs db.iops between 1000 and 256000"),
+    (dict(PROVISIONED_IO1, iops=500), "needs db.iops between 1000 and 256000"),
+    (dict(PROVISIONED_IO1, iops=6000), "0.5 to 50 times db.allocatedStorage"),
+    (dict(PROVISIONED_IO1, allocatedStorage=4000, iops=1000), "0.5 to 50 times db.allocatedStorage"),
+    (dict(PROVISIONED_IO1, storageThroughput=500), "db.storageThroughput only applies to gp3"),
+    ({"storageType": "gp2", "iops": 3000}, "db.storageType gp2 does not take db.iops"),
+    ({"storageType": "gp2", "storageThroughput": 500}, "db.storageThroughput only applies to gp3"),
+    # storage autoscaling needs a 10% margin over the allocated storage
+    ({"maxAllocatedStorage": 50}, "at least 10% above db.allocatedStorage"),
+    ({"maxAllocatedStorage": 54}, "at least 10% above db.allocatedStorage"),
+    ({"instanceClass": "db.t3.micro", "performanceInsights": True}, "not available on db.t3.micro"),
+    ({"instanceClass": "db.t4g.small", "performanceInsights": True}, "not available on db.t4g.small"),
+])
+def test_bad_db(db, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_profile("staging", {"db": db})
+
+
+@pytest.mark.parametrize("db", [
+    PROVISIONED_IO1,
+    dict(PROVISIONED_IO1, storageType="io2", iops=5000),
+    {"maxAllocatedStorage": 55},
+    {"maxAllocatedStorage": None},
+    {"instanceClass": "db.m5.large", "performanceInsights": True},
+    {"allocatedStorage": 400, "maxAllocatedStorage": None, "iops": 12000, "storageThroughput": 500},
+])
+def test_good_db(db):
+    resolved = resolve_profile("staging", {"db": db})["db"]
+    assert all(resolved[key] == value for key, value in db.items())
+
+
+def test_errors_name_the_profile():
+    with pytest.raises(ValueError, match="^sizing profile prod-high-throughput: "):
+        resolve_profile("prod-high-throughput", {"db": {"maxAllocatedStorage": 400}})
+
+
+def test_custom_profiles():
+    profiles = {"tiny": dict(load_profiles()["dev"], instanceType="t3.nano")}
+    assert resolve_profile("tiny", profiles=profiles)["instanceType"] == "t3.nano"
+    with pytest.raises(ValueError, match="expected one of tiny"):
+        resolve_profile("dev", profiles=profiles)
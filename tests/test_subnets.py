@@ -0,0 +1,104 @@
+from ipaddress import ip_network
+
+import pytest
+
+from subnets import SubnetAllocator, default_prefix, find_overlaps
+
+
+def layout(cidr_block, az_count=3, prefix_lengths=None):
+    allocator = SubnetAllocator(cidr_block, prefix_lengths, 2 * az_count)
+    return allocator.allocate("public", az_count) + allocator.allocate("private", az_count)
+
+
+@pytest.mark.parametrize("cidr_block", ["10.0.0.0/8", "10.0.0.0/16", "10.0.0.0/20", "10.0.0.0/21"])
+def test_default_layout_matches_the_old_subnet_list(cidr_block):
+    # the old code took public subnets 0-2 and private subnets 3-5 of every /24 in the VPC
+    subnets_list = list(ip_network("10.0.0.0/21").subnets(new_prefix=24))
+    assert layout(cidr_block) == subnets_list[:6]
+    assert [str(subnet) for subnet in layout(cidr_block)] == ["10.0.%d.0/24" % index for index in range(6)]
+
+
+@pytest.mark.parametrize("cidr_block,az_count", [("10.0.0.0/8", 3), ("10.0.0.0/16", 3), ("10.0.0.0/16", 2)])
+def test_tiers_follow_each_other(cidr_block, az_count):
+    public, private = layout(cidr_block, az_count)[:az_count], layout(cidr_block, az_count)[az_count:]
+    assert private[0].network_address == public[-1].broadcast_address + 1
+    assert not find_overlaps(public + private)
+
+
+@pytest.mark.parametrize("cidr_block,count,prefix", [
+    ("10.0.0.0/16", 6, 24),
+    ("10.0.0.0/21", 8, 24),
+    ("10.0.0.0/22", 4, 24),
+    # only fall back when the /24 layout does not fit
+    ("10.0.0.0/22", 6, 25),
+    ("10.0.0.0/23", 4, 25),
+    ("10.0.0.0/24", 6, 27),
+    ("10.0.0.0/28", 6, 31),
+    ("10.0.0.0/30", 6, 32),
+])
+def test_default_prefix(cidr_block, count, prefix):
+    assert default_prefix(ip_network(cidr_block), count) == prefix
+
+
+def test_default_prefix_without_a_count():
+    assert default_prefix(ip_network("10.0.0.0/22")) == 24
+    assert default_prefix(ip_network("10.0.0.0/24")) == 24
+    assert default_prefix(ip_network("10.0.0.0/26")) == 29
+
+
+def test_small_vpc_fits_the_layout():
+    subnets = layout("10.0.0.0/22")
+    assert all(subnet.prefixlen == 25 for subnet in subnets)
+    assert not find_overlaps(subnets)
+    assert all(subnet.subnet_of(ip_network("10.0.0.0/22")) for subnet in subnets)
+
+
+def test_exhaustion_raises_value_error():
+    allocator = SubnetAllocator("10.0.0.0/22")
+    allocator.allocate("public", 4)
+    with pytest.raises(ValueError, match="no room left"):
+        allocator.allocate("private", 1)
+
+
+def test_exhaustion_with_pinned_prefixes():
+    with pytest.raises(ValueError, match="no room left"):
+        layout("10.0.0.0/16", prefix_lengths={"public": 18, "private": 18})
+
+
+def test_misaligned_mixed_prefixes_are_aligned_to_their_size():
+    allocator = SubnetAllocator("10.0.0.0/16", {"private": 22})
+    public = allocator.allocate("public", 3)
+    private = allocator.allocate("private", 2)
+    data = allocator.allocate("data", 1)
+    assert [str(subnet) for subnet in public] == ["10.0.0.0/24", "10.0.1.0/24", "10.0.2.0/24"]
+    # 10.0.3.0 is not on a /22 boundary, so the private tier starts at 10.0.4.0
+    assert [str(subnet) for subnet in private] == ["10.0.4.0/22", "10.0.8.0/22"]
+    assert [str(subnet) for subnet in data] == ["10.0.12.0/24"]
+    assert allocator.allocated["private"] == private
+    assert not find_overlaps(public + private + data)
+
+
+@pytest.mark.parametrize("tier,prefix", [("public", 15), ("private", 33), ("bogus", 24)])
+def test_bad_prefix_lengths(tier, prefix):
+    with pytest.raises(ValueError):
+        SubnetAllocator("10.0.0.0/16", {tier: prefix})
+
+
+def test_unknown_tier():
+    with pytest.raises(ValueError, match="unknown subnet tier"):
+        SubnetAllocator("10.0.0.0/16").allocate("dmz", 1)
+
+
+def test_find_overlaps():
+    assert find_overlaps(["10.0.0.0/16", "10.1.0.0/16", "10.2.0.0/16"]) == []
+    overlaps = find_overlaps(["10.1.0.0/16", "10.0.0.0/8", "192.168.0.0/16", "10.1.2.0/24"])
+    assert {(str(a), str(b)) for a, b in overlaps} == {
+        ("10.0.0.0/8", "10.1.0.0/16"),
+        ("10.0.0.0/8", "10.1.2.0/24"),
+        ("10.1.0.0/16", "10.1.2.0/24"),
+    }
+
+
+def test_find_overlaps_ignores_adjacent_and_other_versions():
+    assert find_overlaps(["10.0.0.0/24", "10.0.1.0/24", "fd00::/8", "::/0"]) == [
+        (ip_network("::/0"), ip_network("fd00::/8"))]
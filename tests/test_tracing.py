@@ -0,0 +1,42 @@
+import subprocess
+
+import pytest
+
+from tracing import DEFAULTS, daemon_script, tracing_settings
+
+
+def run_daemon_script(machine, has_dpkg):
+    """Run the script with the system commands stubbed out; returns the commands it ran."""
+    stubs = f"""
+uname() {{ echo {machine}; }}
+command() {{ {"true" if has_dpkg else "false"}; }}
+curl() {{ echo "curl $*"; }}
+sudo() {{ echo "sudo $*"; }}
+"""
+    result = subprocess.run(["bash", "-c", stubs + daemon_script(DEFAULTS, "eu-west-1")],
+                            capture_output=True, text=True, check=True)
+    return result.stdout.splitlines()
+
+
+@pytest.mark.parametrize("machine,has_dpkg,package,install", [
+    ("x86_64", True, "aws-xray-daemon-3.x.deb", "sudo dpkg -i"),
+    ("aarch64", True, "aws-xray-daemon-arm64-3.x.deb", "sudo dpkg -i"),
+    ("x86_64", False, "aws-xray-daemon-3.x.rpm", "sudo yum install -y"),
+    ("aarch64", False, "aws-xray-daemon-arm64-3.x.rpm", "sudo yum install -y"),
+])
+def test_daemon_package_matches_the_instance(machine, has_dpkg, package, install):
+    commands = run_daemon_script(machine, has_dpkg)
+    assert commands == [
+        "curl -s -o /tmp/%s https://s3.eu-west-1.amazonaws.com/aws-xray-assets.eu-west-1/xray-daemon/%s"
+        % (package, package),
+        "%s /tmp/%s" % (install, package),
+        "sudo systemctl enable --now xray",
+    ]
+
+
+def test_sampling_rates_are_checked():
+    with pytest.raises(ValueError):
+        tracing_settings({"samplingRate": 1.5})
+    with pytest.raises(ValueError):
+        tracing_settings({"samplingRules": [{"name": "all", "rate": -0.1}]})
+    assert tracing_settings({"samplingRules": [{"name": "all", "rate": 0.5}]})["samplingRules"][0]["urlPath"] == "*"
@@ -0,0 +1,105 @@
+"""X-Ray tracing across the stack, driven by the `tracing` stack config.
+
+The ALB adds an X-Amzn-Trace-Id header to every request. The app instances run
+the X-Ray daemon and report as `service_name` under the sampling rules made
+here. SNS and the Lambda take part with active tracing, so one trace shows the
+app, the topic fan-out, the function and its Mailgun and DynamoDB calls as
+separate hops. The Lambda samples on its own unless the caller already decided.
+The trace group collects every trace through the app service, with X-Ray
+Insights on it.
+"""
+
+import pulumi_aws as aws
+
+DEFAULTS = {
+    "enabled": False,
+    # traced requests per second before `samplingRate` applies
+    "reservoirSize": 1,
+    # share of the requests above the reservoir that are traced
+    "samplingRate": 0.05,
+    # e.g. [{"name": "submissions", "urlPath": "/v1/assignments/*", "httpMethod": "POST", "rate": 0.5}]
+    "samplingRules": [],
+    # anomaly detection on the trace group, with notifications through EventBridge
+    "insights": True,
+    "daemonVersion": "3.x",
+}
+
+RULE_DEFAULTS = {
+    "httpMethod": "*",
+    "urlPath": "*",
+    "reservoirSize": 1,
+}
+
+# X-Ray managed policy for the daemon and the Lambda runtime
+WRITE_POLICY = "arn:aws:iam::aws:policy/AWSXRayDaemonWriteAccess"
+
+
+def tracing_settings(overrides):
+    """Merge the `tracing` config object over DEFAULTS and each sampling rule over RULE_DEFAULTS."""
+    settings = dict(DEFAULTS, **(overrides or {}))
+    settings["samplingRules"] = [dict(RULE_DEFAULTS, **rule) for rule in settings["samplingRules"]]
+    for rate in [settings["samplingRate"]] + [rule["rate"] for rule in settings["samplingRules"]]:
+        if not 0 <= rate <= 1:
+            raise ValueError("tracing sampling rates must be between 0 and 1, got %r" % rate)
+    return settings
+
+
+def daemon_script(settings, region):
+    """User data lines that install the X-Ray daemon from the regional bucket and start it.
+
+    The same user data goes to the x86_64 and arm64 launch templates, so the
+    package is picked on the instance: by `uname -m` for the architecture and
+    by the package manager for deb (Debian, Ubuntu) or rpm (Amazon Linux, RHEL).
+    """
+    url = "https://s3.%s.amazonaws.com/aws-xray-assets.%s/xray-daemon" % (region, region)
+    version = settings["daemonVersion"]
+    return f"""XRAY_ARCH=""
+if [ "$(uname -m)" = "aarch64" ]; then XRAY_ARCH="-arm64"; fi
+if command -v dpkg > /dev/null; then
+  XRAY_PACKAGE="aws-xray-daemon$XRAY_ARCH-{version}.deb"
+  curl -s -o /tmp/$XRAY_PACKAGE {url}/$XRAY_PACKAGE
+  sudo dpkg -i /tmp/$XRAY_PACKAGE
+else
+  XRAY_PACKAGE="aws-xray-daemon$XRAY_ARCH-{version}.rpm"
+  curl -s -o /tmp/$XRAY_PACKAGE {url}/$XRAY_PACKAGE
+  sudo yum install -y /tmp/$XRAY_PACKAGE
+fi
+sudo systemctl enable --now xray
+"""
+
+
+def create_sampling_rules(settings, service_name):
+    """A catch-all rule for `service_name` plus one per `samplingRules` entry, matched first."""
+    rules = [dict(rule, priority=100 + index) for index, rule in enumerate(settings["samplingRules"])]
+    rules.append({
+        "name": "default",
+        "priority": 9000,
+        "rate": settings["samplingRate"],
+        "reservoirSize": settings["reservoirSize"],
+        "httpMethod": "*",
+        "urlPath": "*",
+    })
+    return [aws.xray.SamplingRule("xraySampling-" + rule["name"],
+        # at most 32 characters
+        rule_name=(service_name + "-" + rule["name"])[:32],
+        priority=rule["priority"],
+        version=1,
+        reservoir_size=rule["reservoirSize"],
+        fixed_rate=rule["rate"],
+        service_name=service_name,
+        service_type="*",
+        host="*",
+        http_method=rule["httpMethod"],
+        url_path=rule["urlPath"],
+        resource_arn="*") for rule in rules]
+
+
+def create_trace_group(settings, service_name):
+    """Trace group over every trace that passes through `service_name`."""
+    return aws.xray.Group("xrayTraceGroup",
+        group_name=service_name,
+        filter_expression='service("%s")' % service_name,
+        insights_configuration={
+            "insights_enabled": settings["insights"],
+            "notifications_enabled": settings["insights"],
+        })